@@ -48,17 +48,23 @@ class OKXTradingStrategy:
                 return pd.DataFrame()
 
             data = result['data']
-            df = pd.DataFrame(data,
-                              columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'volCcy', 'volCcyQuote',
-                                       'confirm'])
-
-            # 数据类型转换
-            df['timestamp'] = pd.to_datetime(df['timestamp'].astype(int), unit='ms')
-            for col in ['open', 'high', 'low', 'close', 'volume']:
-                df[col] = df[col].astype(float)
+            if not data:
+                return pd.DataFrame()
 
-            # 按时间排序
-            df = df.sort_values('timestamp').reset_index(drop=True)
+            # 字符串矩阵 zip 转置成列，每列一次整体转型（不逐格 float）；
+            # OKX 返回新→旧，[::-1] 视图即为升序，无需再排序
+            cols = list(zip(*data))
+            df = pd.DataFrame({
+                'timestamp': pd.to_datetime(np.array(cols[0], dtype=np.int64)[::-1], unit='ms'),
+                'open': np.array(cols[1], dtype=float)[::-1],
+                'high': np.array(cols[2], dtype=float)[::-1],
+                'low': np.array(cols[3], dtype=float)[::-1],
+                'close': np.array(cols[4], dtype=float)[::-1],
+                'volume': np.array(cols[5], dtype=float)[::-1],
+                'volCcy': cols[6][::-1],
+                'volCcyQuote': cols[7][::-1],
+                'confirm': cols[8][::-1],
+            })
             return df
 
         except Exception as e:
@@ -68,33 +74,28 @@ class OKXTradingStrategy:
     # 找到higher high 和 higher low
     def find_swing_points(self, df: pd.DataFrame) -> Dict:
         """
-        找到摆动高点和低点
+        找到摆动高点和低点（整列 shift 比较，不逐行 iloc）
         :param df: K线数据
         :return: 高点和低点字典
         """
-        highs = []
-        lows = []
+        if len(df) < 3:
+            return {'highs': [], 'lows': []}
 
-        for i in range(1, len(df) - 1):
-            # 高点：当前高点高于前后各一根K线
-            if df.iloc[i]['high'] > df.iloc[i - 1]['high'] and df.iloc[i]['high'] > df.iloc[i + 1]['high']:
-                highs.append({
-                    'index': i,
-                    'timestamp': df.iloc[i]['timestamp'],
-                    'price': df.iloc[i]['high'],
-                    'type': 'high'
-                })
-
-            # 低点：当前低点低于前后各一根K线
-            if df.iloc[i]['low'] < df.iloc[i - 1]['low'] and df.iloc[i]['low'] < df.iloc[i + 1]['low']:
-                lows.append({
-                    'index': i,
-                    'timestamp': df.iloc[i]['timestamp'],
-                    'price': df.iloc[i]['low'],
-                    'type': 'low'
-                })
+        high, low = df['high'], df['low']
+        # 高点：当前高点高于前后各一根K线；首尾两根 shift 后为 NaN，比较为 False
+        is_high = (high > high.shift(1)) & (high > high.shift(-1))
+        # 低点：当前低点低于前后各一根K线
+        is_low = (low < low.shift(1)) & (low < low.shift(-1))
+
+        return {'highs': self._swing_dicts(df, is_high, high, 'high'),
+                'lows': self._swing_dicts(df, is_low, low, 'low')}
 
-        return {'highs': highs, 'lows': lows}
+    @staticmethod
+    def _swing_dicts(df: pd.DataFrame, mask: pd.Series, price: pd.Series, kind: str) -> List:
+        idx = np.flatnonzero(mask.to_numpy())
+        timestamps = df['timestamp'].iloc[idx].tolist()
+        return [{'index': i, 'timestamp': t, 'price': p, 'type': kind}
+                for i, t, p in zip(idx.tolist(), timestamps, price.to_numpy()[idx])]
 
     def filter_swing_points(self, swing_points: Dict) -> List:
         """
@@ -103,44 +104,23 @@ class OKXTradingStrategy:
         :return: 过滤后的摆动点列表
         """
         all_points = swing_points['highs'] + swing_points['lows']
-        all_points.sort(key=lambda x: x['index'])
-
         if not all_points:
             return []
 
-        filtered_points = [all_points[0]]
-        pending_points = []
+        # 按 index 稳定排序（同一根上高点在前），只排下标数组
+        order = np.argsort([p['index'] for p in all_points], kind='stable')
+        is_high = np.array([p['type'] == 'high' for p in all_points])[order]
+        price = np.array([p['price'] for p in all_points], dtype=float)[order]
 
-        for point in all_points[1:]:
-            last_point = filtered_points[-1]
-
-            # 如果类型相同，需要选择极值
-            if point['type'] == last_point['type']:
-                pending_points.append(point)
-            else:
-                # 处理堆积的相同类型点
-                if pending_points:
-                    if last_point['type'] == 'high':
-                        # 选择最高点
-                        max_point = max([last_point] + pending_points, key=lambda x: x['price'])
-                    else:
-                        # 选择最低点
-                        max_point = min([last_point] + pending_points, key=lambda x: x['price'])
-
-                    filtered_points[-1] = max_point
-                    pending_points = []
-
-                filtered_points.append(point)
-
-        # 处理最后的堆积点
-        if pending_points:
-            if filtered_points[-1]['type'] == 'high':
-                max_point = max([filtered_points[-1]] + pending_points, key=lambda x: x['price'])
-            else:
-                max_point = min([filtered_points[-1]] + pending_points, key=lambda x: x['price'])
-            filtered_points[-1] = max_point
+        # 连续同类点为一段，每段取极值（高点取最高、低点取最低，并列取最早）
+        start = np.r_[True, is_high[1:] != is_high[:-1]]
+        group = np.cumsum(start) - 1
+        signed = np.where(is_high, price, -price)
+        best = np.maximum.reduceat(signed, np.flatnonzero(start))
+        hit = np.flatnonzero(signed == best[group])
+        first = hit[np.r_[True, group[hit][1:] != group[hit][:-1]]]
 
-        return filtered_points
+        return [all_points[k] for k in order[first]]
 
     def determine_initial_trend(self, points: List) -> Optional[str]:
         """
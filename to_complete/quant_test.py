@@ -1,4 +1,7 @@
 from quant_main import *
+import time
+import numpy as np
+import pandas as pd
 import okx.MarketData as MarketData
 import okx.Account as Account
 import matplotlib.pyplot as plt
@@ -224,6 +227,74 @@ def test_trading_signals():
         print(f"OB范围: {h4_ob['low']:.2f} - {h4_ob['high']:.2f}")
 
 
+def _find_swing_points_iloc(df):
+    """旧版逐行 iloc 实现，仅作基准对照"""
+    highs = []
+    lows = []
+    for i in range(1, len(df) - 1):
+        if df.iloc[i]['high'] > df.iloc[i - 1]['high'] and df.iloc[i]['high'] > df.iloc[i + 1]['high']:
+            highs.append({'index': i, 'timestamp': df.iloc[i]['timestamp'],
+                          'price': df.iloc[i]['high'], 'type': 'high'})
+        if df.iloc[i]['low'] < df.iloc[i - 1]['low'] and df.iloc[i]['low'] < df.iloc[i + 1]['low']:
+            lows.append({'index': i, 'timestamp': df.iloc[i]['timestamp'],
+                         'price': df.iloc[i]['low'], 'type': 'low'})
+    return {'highs': highs, 'lows': lows}
+
+
+def _filter_swing_points_sorted(swing_points):
+    """旧版排序 + 逐点合并实现，仅作基准对照"""
+    all_points = swing_points['highs'] + swing_points['lows']
+    all_points.sort(key=lambda x: x['index'])
+    if not all_points:
+        return []
+    filtered_points = [all_points[0]]
+    pending_points = []
+    for point in all_points[1:]:
+        last_point = filtered_points[-1]
+        if point['type'] == last_point['type']:
+            pending_points.append(point)
+        else:
+            if pending_points:
+                pick = max if last_point['type'] == 'high' else min
+                filtered_points[-1] = pick([last_point] + pending_points, key=lambda x: x['price'])
+                pending_points = []
+            filtered_points.append(point)
+    if pending_points:
+        pick = max if filtered_points[-1]['type'] == 'high' else min
+        filtered_points[-1] = pick([filtered_points[-1]] + pending_points, key=lambda x: x['price'])
+    return filtered_points
+
+
+def benchmark_swing_points(sizes=(100, 1000, 10000), repeat=3):
+    """摆动点识别 + 过滤：旧版逐行实现 vs 向量化实现（随机游走数据，无需 API）"""
+    strategy = OKXTradingStrategy.__new__(OKXTradingStrategy)   # 不连接交易所
+    rng = np.random.default_rng(0)
+
+    def best_of(fn):
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - t0)
+        return min(times), result
+
+    for n in sizes:
+        close = 100 + np.cumsum(rng.normal(size=n))
+        open_ = np.r_[close[0], close[:-1]]
+        df = pd.DataFrame({
+            'timestamp': pd.date_range('2024-01-01', periods=n, freq='15min'),
+            'open': open_,
+            'high': np.maximum(open_, close) + rng.random(n),
+            'low': np.minimum(open_, close) - rng.random(n),
+            'close': close,
+            'volume': rng.random(n),
+        })
+        t_old, old = best_of(lambda: _filter_swing_points_sorted(_find_swing_points_iloc(df)))
+        t_new, new = best_of(lambda: strategy.filter_swing_points(strategy.find_swing_points(df)))
+        assert old == new, f"{n} 行结果不一致"
+        print(f"{n:>6} 行: 逐行 {t_old * 1000:9.2f} ms | 向量化 {t_new * 1000:7.2f} ms | 提速 {t_old / t_new:6.1f}x")
+
+
 if __name__ == "__main__":
     print("----- test api connection ----")
     test_api_connection()
@@ -242,4 +313,6 @@ if __name__ == "__main__":
 
     test_structure_break()
 
-    test_trading_signals()
\ No newline at end of file
+    test_trading_signals()
+
+    benchmark_swing_points()
\ No newline at end of file
@@ -0,0 +1,55 @@
+# okx_quant_strategy/async_okx_api.py
+# ──────────────────────────────────────────
+"""
+asyncio 版行情接口（与 okx_api 同名同参，返回值一致）
+    fetch_kline() / fetch_4h_with_ts() / fetch_15m()
+· 复用 okx_api 的同步实现（共享连接池 + 本地仓库），放到 I/O 线程池执行
+· 全局 Semaphore 限制在途请求数：config.ASYNC_CONCURRENCY
+· gather_symbols() 对整个币种池并发跑一轮，单币种异常不影响其它
+"""
+# ──────────────────────────────────────────
+import asyncio
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+import okx_api
+from config import ASYNC_CONCURRENCY
+
+_executor   = ThreadPoolExecutor(max_workers=ASYNC_CONCURRENCY,
+                                 thread_name_prefix="okx-io")
+_semaphores = {}                 # event loop -> Semaphore
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores.clear()      # 旧 loop 已结束（每轮 asyncio.run 一个新 loop）
+        _semaphores[loop] = asyncio.Semaphore(ASYNC_CONCURRENCY)
+    return _semaphores[loop]
+
+async def _run(fn, *args, **kw):
+    async with _semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, partial(fn, *args, **kw))
+
+# ═══════════════════════════════════════
+# 协程版拉取
+# ═══════════════════════════════════════
+async def fetch_kline(symbol:str, bar:str='15m', limit:int=100,
+                      as_series:bool=False):
+    return await _run(okx_api.fetch_kline, symbol, bar, limit, as_series)
+
+async def fetch_4h_with_ts(symbol:str, bars:int=300, end_ts:int=None,
+                           as_series:bool=False):
+    return await _run(okx_api.fetch_4h_with_ts, symbol, bars, end_ts, as_series)
+
+async def fetch_15m(symbol:str, start_ts:int, end_ts:int, as_series:bool=False):
+    return await _run(okx_api.fetch_15m, symbol, start_ts, end_ts, as_series)
+
+# ═══════════════════════════════════════
+# 整池并发
+# ═══════════════════════════════════════
+async def gather_symbols(coros:dict):
+    """
+    coros: symbol -> 协程；返回 symbol -> 结果 / 异常
+    """
+    res = await asyncio.gather(*coros.values(), return_exceptions=True)
+    return dict(zip(coros.keys(), res))
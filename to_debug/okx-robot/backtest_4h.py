@@ -1,53 +1,130 @@
 # okx_quant_strategy/backtest_slice.py
 # ──────────────────────────────────────────
+import os, time, heapq, argparse
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime    import datetime, timezone, timedelta
 from config      import MAX_OPEN_POSITIONS
 from okx_api     import (
-    fetch_usdt_contracts, fetch_4h_with_ts, fetch_15m
+    fetch_usdt_contracts, fetch_4h_with_ts, fetch_15m, fetch_1m
 )
-from strategy_4h import analyze_4h
-from strategy_15m import Trend15State, trend15_states
-from risk_control import active_positions, cancel_position, set_cooldown
+from strategy_4h import Structure4H
+from strategy_15m import Trend15State
+from events       import first_touch, first_penetration, resolve_exit, exit_profit
+from risk_control import StrategyContext, DEFAULT_CTX, cancel_position, set_cooldown
 from logger       import log_trade, log_message
+import rate_limiter, okx_api
 
 CN_TZ = timezone(timedelta(hours=8))
 def fmt(ms): return datetime.fromtimestamp(ms/1000, CN_TZ)\
                              .strftime('%Y-%m-%d %H:%M 整')
 
-def exit_check(price,pos):
-    if pos['trend']=='buy':
-        if price<=pos['sl']: return True,-100
-        if price>=pos['tp']: return True,+250
-    else:
-        if price>=pos['sl']: return True,-100
-        if price<=pos['tp']: return True,+250
-    return False,0
+M15 = 15*60*1000
+
+def locate_exit(sym, pos, kl15, ctx=DEFAULT_CTX):
+    """
+    持仓在 kl15（开仓之后的 15m）内的出场 → (出场那根的 ts, 盈亏)；未出场 → (None, 0)
+    影线触及即成交；同根同时触及 SL / TP 时只下钻该根的 1m（本地仓库）
+    """
+    drill = lambda j: fetch_1m(sym, int(kl15.ts[j]), int(kl15.ts[j])+M15-1, as_series=True)
+    j, hit = resolve_exit(kl15, pos, drill=drill)
+    return (None, 0) if j is None else \
+           (int(kl15.ts[j]), exit_profit(hit, ctx.risk_usd, ctx.tp_ratio))
+
+def settle_exits(ctx:StrategyContext, ts:int=None, symbol:str=None):
+    """
+    结算 ctx.pending_exits 里出场根在 ts 之前已收盘的持仓（ts=None：全部；
+    symbol 给定时只看该币种）：撤持仓、计入该币种的胜负 / 盈亏、记 log_trade。
+    持仓已被撤掉（或换成新持仓）的出场直接丢弃
+    """
+    for sym, (exit_ts, pos, prof, stats) in list(ctx.pending_exits.items()):
+        if (symbol is not None and sym != symbol) or \
+           (ts is not None and exit_ts + M15 > ts):
+            continue
+        del ctx.pending_exits[sym]
+        if ctx.active_positions.get(sym) is not pos:
+            continue
+        cancel_position(sym, ctx)
+        stats['wins']   += prof>0
+        stats['losses'] += prof<0
+        stats['pnl']    += prof
+        log_trade(sym, pos['trend'], pos['entry'], pos['sl'], pos['tp'], prof)
+
+def _result(stats:dict):
+    """replay_symbol 的计数 → 结果 dict；无交易 → None"""
+    if stats is None: return None
+    trades = stats['wins'] + stats['losses']
+    if trades == 0: return None
+    return {'symbol': stats['symbol'], 'trades': trades, 'wins': stats['wins'],
+            'losses': stats['losses'], 'pnl': stats['pnl'],
+            'win_rate': stats['wins']/trades*100}
 
 def first_touch_idx(kl15, tr, ob):
-    for j,(_,o,h,l,c) in enumerate(kl15):
-        if tr=='uptrend'   and ob['bottom']<=l<=ob['top']:
-            return j
-        if tr=='downtrend' and ob['bottom']<=h<=ob['top']:
-            return j
-    return None
+    """窗口内首次触碰 OB 的序号（掩码 + argmax，见 events.first_touch）"""
+    return first_touch(kl15, tr, ob)
 # ──────────────────────────────────────────
-def backtest_symbol(sym:str):
-
-    kl4, ts4 = fetch_4h_with_ts(sym, 300)      # OHLC + 每根 4h 的时间戳
+def backtest_symbol(sym:str, preload:bool=True, ctx:StrategyContext=None,
+                    kl4=None, kl15=None):
+    """
+    preload=True : 整个 4H 窗口的 15m 一次性载入 CandleSeries，逐根 4H 二分切片（视图）
+    preload=False: 每根 4H 单独 fetch_15m（旧模式）
+    ctx          : 持仓 / 冷却 / 15m 状态所在的 StrategyContext（默认 DEFAULT_CTX）；
+                   各回测传各自的 ctx 即可同进程并行；
+                   ctx.clock_ms 随事件时间推进，冷却 / 开仓时间都按 K 线时间计
+    kl4 / kl15   : 调用方已备好的 4H / 15m CandleSeries（如参数扫描的共享内存），不再拉取
+    """
+    ctx   = ctx or DEFAULT_CTX
+    steps = replay_symbol(sym, ctx, preload, kl4, kl15)
+    try:
+        while True:
+            ctx.clock_ms = next(steps)
+            settle_exits(ctx, ctx.clock_ms)
+    except StopIteration as e:
+        stats = e.value
+    settle_exits(ctx, symbol=sym)                   # 数据内已定位的出场都结算
+    return _result(stats)
+
+def replay_symbol(sym:str, ctx:StrategyContext, preload:bool=True, kl4=None, kl15=None):
+    """
+    单币种回测过程（生成器）：每根 4H 开始、每根 15m 处理之前 yield 事件时间（ms），
+    下一次 next() 才处理该事件；结束时 return 计数 dict（数据不足为 None）
+    · 每根 15m 只喂状态机一次：本根 4H 之前、或已处理过的 K 线只作为新状态机
+      的历史，不会再逐根推进（不会在过去的 K 线上重复开仓）
+    · 新持仓一次定位出场，登记到 ctx.pending_exits；出场根被处理时当场结算，
+      否则（该窗口被跳过 / 状态机已退出）由驱动方按事件时间 settle_exits
+    backtest_symbol 直接跑完；backtest_portfolio 按事件时间把各币种交错推进
+    """
+    if kl4 is None:
+        kl4 = fetch_4h_with_ts(sym, 300, as_series=True)   # 列式 OHLC + ts
+    ts4 = kl4.ts.tolist()                              # 每根 4h 的时间戳
     if len(kl4) < 120:
         log_message(f'{sym} 4H 数据不足'); return None
 
-    wins=losses=pnl=0
+    if kl15 is not None:
+        get15 = kl15.between
+    elif preload:
+        pre   = fetch_15m(sym, ts4[0], ts4[-1]+4*3600*1000-1, as_series=True)
+        get15 = pre.between
+    else:
+        get15 = lambda st, et: fetch_15m(sym, st, et, as_series=True)
+    last_et = ts4[-1]+4*3600*1000-1
+
+    stats = {'symbol': sym, 'wins': 0, 'losses': 0, 'pnl': 0}
     cur_tr=cur_ob=None
     state_open=False
     state=None
+    exit_pos=None                              # 已定位出场的持仓
+    last15=-1                                  # 已喂入状态机的最后一根 15m
+    s4 = Structure4H()                         # 增量 4H 结构，每根只喂一次
 
     i=100                                      # 先用 100 根观察期
     while i < len(kl4):
+        yield ts4[i]
 
-        # 1. 计算最新 4H 趋势 & OB
-        tr, info, ob = analyze_4h(kl4[:i+1], sym)
+        # 1. 计算最新 4H 趋势 & OB（等价 analyze_4h(kl4[:i+1])）
+        s4.extend(kl4[len(s4):i+1])
+        tr, info, ob = s4.analyze()
         if tr is None or ob is None:
             i+=1; continue
 
@@ -57,8 +134,8 @@ def backtest_symbol(sym:str):
 
         # 3. 4H 趋势 / OB 改变 ⇒ 撤单 & 清理 15m
         if tr!=cur_tr or ob!=cur_ob:
-            cancel_position(sym)
-            trend15_states.pop(sym, None)
+            cancel_position(sym, ctx)
+            ctx.trend15_states.pop(sym, None)
             state_open=False
             cur_tr, cur_ob = tr, ob
 
@@ -74,7 +151,7 @@ def backtest_symbol(sym:str):
             ### TODO : 一个强劲的上升趋势可能在20天前就形成了一个Higher Low。之后价格一路上涨，即便有小回调，但没有跌破那个关键的低点
             ## 在这里fetch_15m
             ref_ts  = ts4[ref_idx]
-            kl15_window = fetch_15m(sym, ref_ts, et_4h)
+            kl15_window = get15(ref_ts, et_4h)
             #print("kl15_window",kl15_window)
             if not kl15_window: i+=1; continue
 
@@ -83,39 +160,45 @@ def backtest_symbol(sym:str):
             if idx is None:                     # 整窗无触碰
                 i+=1; continue
 
-            hist15  = kl15_window[:idx]         # 初始化片段
-            feed15  = kl15_window[idx:]         # 含触碰及之后
-            state   = Trend15State(sym, ob, tr, st_4h, hist15)
+            # 触碰在过去：触碰及之后到 cut 的 K 线只作历史；其间已刺穿则本段作废
+            cut = int(np.searchsorted(kl15_window.ts, max(st_4h, last15+1)))
+            if idx < cut and first_penetration(kl15_window[idx:cut], tr, ob) is not None:
+                i+=1; continue
+            start   = max(idx, cut)
+            hist15  = kl15_window[:start]       # 初始化片段
+            feed15  = kl15_window[start:]       # 本根 4H 内、未处理过的 K 线
+            state   = Trend15State(sym, ob, tr, st_4h, hist15,
+                                   manage_exits=False, ctx=ctx)
             state_open=True
+            if not feed15: i+=1; continue
         else:
             # 已在跟踪：仅取本根 4H 的 15m
-            feed15 = fetch_15m(sym, st_4h, et_4h)
+            feed15 = get15(st_4h, et_4h)
             if not feed15: i+=1; continue
 
-        # 6. 逐根 15m 推进
-        for ts,o,h,l,c in feed15:
+        # 6. 逐根 15m 推进；OB 刺穿处先整段定位，推进到该根为止
+        pen = first_penetration(feed15, tr, ob)
+        if pen is not None:
+            feed15 = feed15[:pen+1]
+        for j,(ts,o,h,l,c) in enumerate(feed15):
+            yield ts
             state.update([ts,o,h,l,c])
+            last15 = ts
 
-            # a) 止盈 / 止损
-            pos = active_positions.get(sym)
-            if pos:
-                done, prof = exit_check(c, pos)
-                if done:
-                    removed = cancel_position(sym)
-                    if removed:
-                        wins  += prof>0
-                        losses+= prof<0
-                        pnl   += prof
-                        log_trade(sym, removed['trend'],
-                                  removed['entry'], removed['sl'],
-                                  removed['tp'], prof)
+            # a) 止盈 / 止损：新持仓在其后全部 15m 上一次定位出场根，到达该根才结算
+            pos = ctx.active_positions.get(sym)
+            if pos is not None and pos is not exit_pos:
+                exit_pos = pos
+                exit_ts, exit_prof = locate_exit(sym, pos, get15(ts+M15, last_et), ctx)
+                if exit_ts is not None:
+                    ctx.pending_exits[sym] = (exit_ts, pos, exit_prof, stats)
+            settle_exits(ctx, ts+M15, sym)      # 出场根就是本根 → 当场结算
 
             # b) OB 刺穿 ⇒ 冷却 & 清理
-            if (tr=='uptrend' and l<ob['bottom']) or \
-               (tr=='downtrend' and h>ob['top']):
-                set_cooldown(sym, 24)
-                cancel_position(sym)
-                trend15_states.pop(sym, None)
+            if j == pen:
+                set_cooldown(sym, ctx=ctx)
+                cancel_position(sym, ctx)
+                ctx.trend15_states.pop(sym, None)
                 state_open=False
                 break
 
@@ -126,27 +209,114 @@ def backtest_symbol(sym:str):
 
         i+=1                                    # 下一根 4H
 
-    trades=wins+losses
-    if trades==0: return None
-    return {
-        'symbol'  : sym,
-        'trades'  : trades,
-        'wins'    : wins,
-        'losses'  : losses,
-        'pnl'     : pnl,
-        'win_rate': wins/trades*100
-    }
+    return stats
 # ──────────────────────────────────────────
-if __name__=='__main__':
-    #syms = fetch_usdt_contracts()[:200] or \
-    #       ['BTC-USDT-SWAP','ETH-USDT-SWAP','SOL-USDT-SWAP']
-    syms = ['PI-USDT-SWAP']
-    res=[]
-    for s in syms:
-        print(f'\n=== 回测 {s} ===')
-        r = backtest_symbol(s)
+# 多币种：进程池分片
+# ──────────────────────────────────────────
+def _init_worker(workers:int):
+    okx_api.reset_after_fork()                 # 不用继承来的线程池 / 连接
+    rate_limiter.set_share(1/workers)          # 各进程平分同一 IP 的接口预算
+
+def _run_one(sym:str):
+    """
+    子进程入口：单币种异常只记在结果里，不影响其它币种
+    每个币种独立回测：各用一个新的 StrategyContext，结果与分片方式无关
+    """
+    try:
+        return sym, backtest_symbol(sym, ctx=StrategyContext()), None
+    except Exception as e:
+        return sym, None, repr(e)
+
+def run_universe(symbols, workers:int=None):
+    """
+    symbols 分发到 workers 个进程（默认 CPU 核数）逐个回测，完成一个打印一行进度
+    → 有交易的结果 dict 列表（按 symbols 原顺序）
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(symbols) or 1))
+    order   = {s: k for k, s in enumerate(symbols)}
+    res, t0 = [], time.time()
+
+    def report(n, sym, r, err):
+        tag = f"异常 {err}" if err else \
+              (f"{r['trades']} 笔 pnl={r['pnl']}" if r else "无交易")
+        print(f"[{n}/{len(symbols)}] {sym:<20} {tag}  ({time.time()-t0:.0f}s)",
+              flush=True)
         if r: res.append(r)
 
+    if workers == 1:
+        for n, s in enumerate(symbols, 1):
+            report(n, *_run_one(s))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(workers,)) as ex:
+            futs = [ex.submit(_run_one, s) for s in symbols]
+            for n, f in enumerate(as_completed(futs), 1):
+                report(n, *f.result())
+    return sorted(res, key=lambda r: order[r['symbol']])
+
+# ──────────────────────────────────────────
+# 组合回测：所有币种按时间归并，共用一个风控 context
+# ──────────────────────────────────────────
+def _events(k:int, sym:str, ctx:StrategyContext, results:list):
+    """replay_symbol 的事件流 → (ts, k)；结束时计数 dict 追加到 results"""
+    steps = replay_symbol(sym, ctx, preload=False)   # 15m 按 4H 窗口现取，不整段常驻
+    while True:
+        try:
+            ts = next(steps)
+        except StopIteration as e:
+            if e.value: results.append(e.value)
+            return
+        except Exception as e:
+            log_message(f'[组合回测] {sym} 异常 {e!r}，该币种停止')
+            return
+        yield ts, k
+
+def backtest_portfolio(symbols, max_positions:int=MAX_OPEN_POSITIONS):
+    """
+    全部币种放进同一个 StrategyContext，按事件时间 k 路归并（heapq.merge）逐个推进：
+      · 同时持仓上限 max_positions 跨币种生效，先到先得
+      · 冷却按事件时间计（ctx.clock_ms），到期自动解除
+      · 每个事件之前先按时间结算所有币种已到出场根的持仓（settle_exits），
+        不论该币种此时是否还在跟踪，出场后立即让出仓位
+      · 各币种只在事件时间 = 本根 15m 开盘时间时开仓（replay_symbol 不回放旧 K 线），
+        占仓位 / 记冷却的时间就是真实开仓时间
+    每个币种只常驻 4H 序列与当前窗口的 15m → (各币种结果 dict 列表, ctx)
+    """
+    ctx = StrategyContext(max_positions)
+    results = []
+    streams = [_events(k, s, ctx, results) for k, s in enumerate(symbols)]
+    for ts, _ in heapq.merge(*streams):
+        # merge 下一次向该币种取事件时，它才处理这一根：先把时钟拨到 ts
+        ctx.clock_ms = ts
+        settle_exits(ctx, ts)
+    settle_exits(ctx)
+    order = {s: k for k, s in enumerate(symbols)}
+    results = [r for r in map(_result, results) if r]
+    return sorted(results, key=lambda r: order[r['symbol']]), ctx
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="4H OB + 15m 结构 多币种回测")
+    p.add_argument("symbols", nargs="*", help="指定币种；缺省为全部 USDT-SWAP")
+    p.add_argument("--top", type=int, default=None, help="只取前 N 个币种")
+    p.add_argument("--workers", type=int, default=None, help="进程数（默认 CPU 核数）")
+    p.add_argument("--portfolio", action="store_true",
+                   help=f"组合回测：按时间归并，同时持仓上限 {MAX_OPEN_POSITIONS} 跨币种生效")
+    return p.parse_args(argv)
+
+if __name__=='__main__':
+    # python backtest_4h.py                      全部 USDT-SWAP，每核一个进程
+    # python backtest_4h.py --top 50 --workers 8
+    # python backtest_4h.py PI-USDT-SWAP         单币种
+    # python backtest_4h.py --portfolio --top 100  组合回测（单进程，按时间归并）
+    args = parse_args()
+    syms = args.symbols or fetch_usdt_contracts()
+    if args.top: syms = syms[:args.top]
+    print(f'=== 回测 {len(syms)} 个币种 ===')
+    if args.portfolio:
+        res, _ = backtest_portfolio(syms)
+    else:
+        res = run_universe(syms, args.workers)
+
     if res:
         df = pd.DataFrame(res)
         print(df)
@@ -0,0 +1,129 @@
+# okx_quant_strategy/candle_feed.py
+# ──────────────────────────────────────────
+"""
+推送式 K 线源（仿 OKX business 频道 candle4H / candle15m）
+· 只向外推“已收盘”K 线（confirm=1），事件：CandleEvent(symbol, bar, [ts,o,h,l,c])
+· OKXCandleFeed    : 实盘 wss 推送（需 pip install websockets）
+· ReplayCandleFeed : 离线替身，按收盘时间顺序回放本地仓库录下的 K 线，
+                     消息格式与 OKX 推送完全一致，走同一个 parse_push()
+· serve_replay()   : 把回放开成本地 websocket 服务，供 OKXCandleFeed(url=...) 连接
+两种 feed 都是异步迭代器：  async for ev in feed: ...
+"""
+# ──────────────────────────────────────────
+import json, heapq, asyncio
+from collections import namedtuple
+from candle_store import CandleStore, BAR_MS
+from logger import logger
+
+OKX_WS_BUSINESS = "wss://ws.okx.com:8443/ws/v5/business"
+RECONNECT_SEC   = 5
+BAR_PRIORITY    = {"4H": 0, "1H": 1, "15m": 2, "1m": 3}   # 同一时刻先推大周期
+
+CandleEvent = namedtuple("CandleEvent", "symbol bar candle")
+
+def subscribe_msg(symbols, bars):
+    return {"op": "subscribe",
+            "args": [{"channel": f"candle{b}", "instId": s}
+                     for s in symbols for b in bars]}
+
+def parse_push(msg:dict):
+    """
+    OKX 推送 → [CandleEvent]；订阅回执 / 未收盘 K 线返回 []
+      {"arg":{"channel":"candle15m","instId":"BTC-USDT-SWAP"},
+       "data":[["ts","o","h","l","c","vol","volCcy","volCcyQuote","confirm"]]}
+    """
+    arg = msg.get("arg", {})
+    if "data" not in msg or not arg.get("channel", "").startswith("candle"):
+        return []
+    bar = arg["channel"][len("candle"):]
+    return [CandleEvent(arg["instId"], bar,
+                        [int(r[0]), float(r[1]), float(r[2]),
+                         float(r[3]), float(r[4])])
+            for r in msg["data"] if r[8] == "1"]
+
+# ═══════════════════════════════════════
+# 1) 实盘推送
+# ═══════════════════════════════════════
+class OKXCandleFeed:
+    def __init__(self, symbols, bars=("4H", "15m"), url:str=OKX_WS_BUSINESS):
+        self.symbols, self.bars, self.url = list(symbols), list(bars), url
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        import websockets                      # 可选依赖，仅推送模式需要
+        while True:
+            try:
+                async with websockets.connect(self.url, ping_interval=20) as ws:
+                    await ws.send(json.dumps(subscribe_msg(self.symbols, self.bars)))
+                    logger.info(f"[推送] 已订阅 {len(self.symbols)} 个币种 {self.bars}")
+                    async for raw in ws:
+                        for ev in parse_push(json.loads(raw)):
+                            yield ev
+            except (OSError, websockets.ConnectionClosed) as e:
+                logger.warning(f"[推送] 连接断开: {e!r}，{RECONNECT_SEC}s 后重连")
+                await asyncio.sleep(RECONNECT_SEC)
+
+# ═══════════════════════════════════════
+# 2) 离线回放替身
+# ═══════════════════════════════════════
+class ReplayCandleFeed:
+    """
+    回放 [start_ts, end_ts]（按开盘时间）内本地仓库中的 K 线
+      speed=0  : 不等待，尽快推完（测试 / 回放）
+      speed=k  : 按真实时间 k 倍速推送
+    """
+    def __init__(self, symbols, start_ts:int, end_ts:int,
+                 bars=("4H", "15m"), speed:float=0, store:CandleStore=None):
+        self.symbols, self.bars = list(symbols), list(bars)
+        self.start_ts, self.end_ts, self.speed = start_ts, end_ts, speed
+        self.store = store or CandleStore()
+
+    def _stream(self, symbol, bar):
+        ts, o, h, l, c = self.store.load(symbol, bar, self.start_ts, self.end_ts)
+        close = ts + BAR_MS[bar]
+        pri   = BAR_PRIORITY.get(bar, 9)
+        for i in range(len(ts)):
+            row = [str(int(ts[i])), repr(float(o[i])), repr(float(h[i])),
+                   repr(float(l[i])), repr(float(c[i])), "0", "0", "0", "1"]
+            yield (int(close[i]), pri, symbol), \
+                  {"arg": {"channel": f"candle{bar}", "instId": symbol},
+                   "data": [row]}
+
+    def messages(self):
+        """按 (收盘时间, 周期) 归并所有 (symbol, bar) 的推送消息"""
+        streams = [self._stream(s, b) for s in self.symbols for b in self.bars]
+        for _, msg in heapq.merge(*streams, key=lambda x: x[0]):
+            yield msg
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        last = None
+        for msg in self.messages():
+            close = int(msg["data"][0][0]) + BAR_MS[msg["arg"]["channel"][6:]]
+            if self.speed and last is not None and close > last:
+                await asyncio.sleep((close - last) / 1000 / self.speed)
+            last = close
+            for ev in parse_push(msg):
+                yield ev
+            await asyncio.sleep(0)             # 让出事件循环
+
+async def serve_replay(replay:ReplayCandleFeed, host:str="127.0.0.1",
+                       port:int=8765):
+    """
+    本地 websocket 替身服务：收到订阅后按回放顺序推送
+    （需 websockets；返回 server 对象，调用方负责 close）
+    """
+    import websockets
+
+    async def handler(ws, *_):
+        await ws.recv()                        # 订阅请求，内容忽略
+        await ws.send(json.dumps({"event": "subscribe"}))
+        for msg in replay.messages():
+            await ws.send(json.dumps(msg))
+        await ws.close()
+
+    return await websockets.serve(handler, host, port)
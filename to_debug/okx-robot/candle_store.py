@@ -0,0 +1,131 @@
+# okx_quant_strategy/candle_store.py
+# ──────────────────────────────────────────
+"""
+本地 K 线仓库（列式 .npy，读时 mmap）
+  <root>/<instId>/<bar>/
+      ts.npy o.npy h.npy l.npy c.npy   # 升序、按 ts 去重
+      meta.json                        # {"start": ms, "end": ms} 已覆盖区间
+  <root>/<instId>/<bar>-windows/<start>_<end>.npy
+                                       # 稀疏窗口（如 1m 下钻），一窗一文件
+· 只存已收盘 K 线；覆盖区间内缺的 K 线视为交易所本身无数据
+· 覆盖区间始终连续，上层只需补 [start, end] 之外的头 / 尾缺口
+· 稀疏窗口不并入、不扩展覆盖区间；单文件原子替换，多进程同时写同一窗也安全
+"""
+# ──────────────────────────────────────────
+import os, json, threading
+import numpy as np
+from config import CANDLE_STORE_DIR
+
+BAR_MS = {
+    "1m":  60_000,
+    "15m": 15 * 60_000,
+    "1H":  3600_000,
+    "4H":  4 * 3600_000,
+}
+COLUMNS = ("ts", "o", "h", "l", "c")
+_DTYPES = {"ts": np.int64, "o": np.float64, "h": np.float64,
+           "l": np.float64, "c": np.float64}
+
+
+class CandleStore:
+    def __init__(self, root:str=CANDLE_STORE_DIR):
+        self.root  = root
+        self._mmap = {}                  # (instId, bar) -> {col: memmap}
+
+    def _dir(self, symbol:str, bar:str):
+        return os.path.join(self.root, symbol, bar)
+
+    # ---------- 元信息 ----------
+    def coverage(self, symbol:str, bar:str):
+        """已覆盖区间 (start_ms, end_ms)；从未写入返回 None"""
+        path = os.path.join(self._dir(symbol, bar), "meta.json")
+        if not os.path.exists(path): return None
+        with open(path, encoding="utf-8") as f:
+            meta = json.load(f)
+        return meta["start"], meta["end"]
+
+    def symbols(self, bar:str, start_ts:int=None, end_ts:int=None):
+        """仓库里 bar 有覆盖区间（且与 [start_ts, end_ts] 相交）的 instId，按名排序"""
+        if not os.path.isdir(self.root): return []
+        out = []
+        for sym in sorted(os.listdir(self.root)):
+            cov = self.coverage(sym, bar)
+            if cov and (start_ts is None or cov[1] >= start_ts) \
+                   and (end_ts is None or cov[0] <= end_ts):
+                out.append(sym)
+        return out
+
+    # ---------- 读 ----------
+    def _columns(self, symbol:str, bar:str):
+        key = (symbol, bar)
+        if key not in self._mmap:
+            d = self._dir(symbol, bar)
+            if not os.path.exists(os.path.join(d, "ts.npy")):
+                return {k: np.empty(0, _DTYPES[k]) for k in COLUMNS}
+            self._mmap[key] = {k: np.load(os.path.join(d, f"{k}.npy"),
+                                          mmap_mode="r")
+                               for k in COLUMNS}
+        return self._mmap[key]
+
+    def load(self, symbol:str, bar:str, start_ts:int, end_ts:int):
+        """
+        返回 [start_ts, end_ts] 内的 (ts, o, h, l, c) 五列（mmap 只读视图）
+        """
+        cols = self._columns(symbol, bar)
+        ts   = cols["ts"]
+        a = int(np.searchsorted(ts, start_ts, "left"))
+        b = int(np.searchsorted(ts, end_ts,   "right"))
+        return tuple(cols[k][a:b] for k in COLUMNS)
+
+    # ---------- 写 ----------
+    def merge(self, symbol:str, bar:str, cols, start_ts:int, end_ts:int):
+        """
+        并入新 K 线（cols = (ts,o,h,l,c) 五列），并把覆盖区间扩展到
+        [start_ts, end_ts]；调用方保证新区间与旧覆盖区间相邻或重叠。
+        同一 ts 以新数据为准。
+        """
+        old = {k: np.asarray(v) for k, v in
+               zip(COLUMNS, self.load(symbol, bar, -2**62, 2**62))}
+        new = {k: np.asarray(v, dtype=_DTYPES[k]) for k, v in zip(COLUMNS, cols)}
+        merged = {k: np.concatenate([new[k], old[k]]) for k in COLUMNS}
+        _, keep = np.unique(merged["ts"], return_index=True)   # 首次出现 = 新数据
+        merged = {k: v[keep] for k, v in merged.items()}        # unique 已按 ts 升序
+
+        cov = self.coverage(symbol, bar)
+        if cov:
+            start_ts, end_ts = min(start_ts, cov[0]), max(end_ts, cov[1])
+
+        d = self._dir(symbol, bar)
+        os.makedirs(d, exist_ok=True)
+        self._mmap.pop((symbol, bar), None)   # 释放旧 mmap 再替换文件
+        for k in COLUMNS:
+            tmp = os.path.join(d, f"{k}.npy.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, merged[k])
+            os.replace(tmp, os.path.join(d, f"{k}.npy"))
+        tmp = os.path.join(d, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"start": int(start_ts), "end": int(end_ts)}, f)
+        os.replace(tmp, os.path.join(d, "meta.json"))
+
+    # ---------- 稀疏窗口 ----------
+    def _window_path(self, symbol:str, bar:str, start_ts:int, end_ts:int):
+        return os.path.join(self.root, symbol, f"{bar}-windows",
+                            f"{int(start_ts)}_{int(end_ts)}.npy")
+
+    def load_window(self, symbol:str, bar:str, start_ts:int, end_ts:int):
+        """save_window 存过的 [start_ts, end_ts] → (ts,o,h,l,c)；没存过 → None"""
+        path = self._window_path(symbol, bar, start_ts, end_ts)
+        if not os.path.exists(path): return None
+        a = np.load(path)                               # (5, n) float64
+        return (a[0].astype(np.int64),) + tuple(a[1:])
+
+    def save_window(self, symbol:str, bar:str, start_ts:int, end_ts:int, cols):
+        """单独存一段窗口的 K 线（窗内缺的视为交易所无数据），覆盖区间不变"""
+        path = self._window_path(symbol, bar, start_ts, end_ts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.array([np.asarray(c, dtype=np.float64) for c in cols])
+                         .reshape(5, -1))
+        os.replace(tmp, path)
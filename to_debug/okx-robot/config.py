@@ -1,4 +1,7 @@
 # okx_quant_strategy/config.py
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))   # 本地数据都放在本目录下，与启动目录无关
 
 API_KEY = "your_api_key"
 SECRET_KEY = "your_secret_key"
@@ -7,9 +10,20 @@ PASSPHRASE = "your_passphrase"
 BASE_URL = "https://www.okx.com"
 MAX_OPEN_POSITIONS = 5
 COOLDOWN_DURATION_HOURS = 24
-MIN_VOLUME_THRESHOLD = 1_000_000  # 最低交易量过滤
+MIN_VOLUME_THRESHOLD = 1_000_000  # 最低交易量过滤（24h 成交额, USDT）
+UNIVERSE_SIZE = 200               # 币种池上限（按 24h 成交额排序取前 N）
+UNIVERSE_REFRESH_HOURS = 4        # 币种池刷新间隔
 FIXED_RISK_USD = 100  # 固定止损金额（单位：USDT）
 TP_RATIO = 2.5  # 盈亏比
 BACKTEST = True          # 回测=True；实盘=False
+CANDLE_STORE_DIR = os.path.join(BASE_DIR, "data", "candles")   # 本地 K 线仓库（candle_store.py）
+HTTP_POOL_SIZE   = 32     # 每个 host 保持的 keep-alive 连接数（http_session.py）
+HTTP_POOL_HOSTS  = 4      # 缓存的 host 连接池数
+ASYNC_CONCURRENCY = 16    # async_okx_api 同时在途请求数（≤ HTTP_POOL_SIZE）
+FETCH_CONCURRENCY = 8     # 深度历史分窗并发拉取的线程数
+INSTRUMENT_CACHE_FILE = os.path.join(BASE_DIR, "data", "instruments.json")   # 合约元数据落盘（instruments.py）
+INSTRUMENT_TTL_HOURS  = 24
+TREND15_BUFFER_SIZE = 2000        # Trend15State 保留的 15m 根数（约 20 天，环形缓冲）
+SWEEP_RESULTS_DIR = os.path.join(BASE_DIR, "data", "sweeps")   # 参数扫描结果表（sweep.py）
 
 
@@ -0,0 +1,92 @@
+# okx_quant_strategy/conftest.py
+# ──────────────────────────────────────────
+"""
+pytest 公共夹具（测试全部离线）
+· offline  : 自动生效；okx_api._safe_get 换成确定性的假 OKX，
+             K 线仓库 / 合约表落到 tmp_path，不碰 data/ 也不联网
+· synth    : 合成行情 make(seed, n4) → (4H, 15m) CandleSeries，
+             15m 随机游走（带趋势段），4H 由 15m 聚合
+· okx_calls: 假 OKX 收到的请求 [(接口, params), ...]
+"""
+# ──────────────────────────────────────────
+import time, random
+import numpy as np
+import pytest
+
+import okx_api, rate_limiter, logger
+from candle_store import CandleStore, BAR_MS
+from candles      import CandleSeries
+from instruments  import InstrumentRegistry
+
+M15, M4 = BAR_MS["15m"], BAR_MS["4H"]
+SYMBOLS = ["X-USDT-SWAP", "Y-USDT-SWAP", "Z-USDT-SWAP"]
+
+
+def fake_price(bar:str, ts:int):
+    r = random.Random(f"{bar}{ts}")
+    base = 100 + (ts // 3600_000) % 50
+    o, c = base + r.random(), base + r.random()
+    return o, max(o, c) + r.random(), min(o, c) - r.random(), c
+
+
+class FakeOKX:
+    """按 OKX 分页语义（after = 早于该 ts，降序，limit 根）返回确定性 K 线"""
+    def __init__(self, listed_days:int=400):
+        self.listed, self.calls = self.now - listed_days*86400_000, []
+
+    @property
+    def now(self):
+        return int(time.time()*1000)
+
+    def __call__(self, url, params, tag, **kw):
+        self.calls.append((url.rsplit("/", 1)[-1], dict(params)))
+        if url.endswith("instruments"):
+            return {"data": [{"instId": s, "tickSz": "0.01", "lotSz": "1",
+                              "ctVal": "0.1", "minSz": "1"} for s in SYMBOLS]}
+        ms  = BAR_MS[params["bar"]]
+        cur = self.now // ms * ms
+        listed = self.listed // ms * ms
+        top = min((params["after"] - 1) // ms * ms if "after" in params else cur, cur)
+        rows, t = [], top
+        while len(rows) < params.get("limit", 100) and t >= listed:
+            rows.append([str(t), *map(repr, fake_price(params["bar"], t)),
+                         "1", "1", "1", "0" if t == cur else "1"])
+            t -= ms
+        if "history" in url:
+            rows = [r for r in rows if r[8] == "1"]
+        return {"data": rows}
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch, tmp_path):
+    fake = FakeOKX()
+    monkeypatch.setattr(okx_api, "_safe_get", fake)
+    monkeypatch.setattr(okx_api, "_store", CandleStore(str(tmp_path / "candles")))
+    monkeypatch.setattr(okx_api, "_instruments", InstrumentRegistry(
+        okx_api.fetch_swap_instruments, path=str(tmp_path / "instruments.json")))
+    monkeypatch.setattr(rate_limiter, "acquire", lambda url: 0.0)
+    monkeypatch.setattr(logger.logger, "disabled", True)      # 回测逐根日志只是噪声
+    return fake
+
+
+@pytest.fixture
+def okx_calls(offline):
+    return offline.calls
+
+
+@pytest.fixture
+def synth():
+    def make(seed:int, n4:int=300, t0:int=1_700_006_400_000):
+        rr = random.Random(seed)
+        rows15, c, drift = [], 100.0, 0.0
+        for k in range(n4 * 16):
+            if k % (16 * rr.randint(5, 30)) == 0:
+                drift = rr.uniform(-.3, .3)
+            o = c; c = max(1.0, c + drift + rr.gauss(0, 1))
+            rows15.append([t0 + k*M15, o, max(o, c) + rr.random()*.8,
+                           min(o, c) - rr.random()*.8, c])
+        a = np.array(rows15)
+        rows4 = [[b[0, 0], b[0, 1], b[:, 2].max(), b[:, 3].min(), b[-1, 4]]
+                 for b in (a[i*16:(i+1)*16] for i in range(n4))]
+        return CandleSeries.from_rows(rows4), CandleSeries.from_rows(rows15)
+    return make
@@ -0,0 +1,71 @@
+# okx_quant_strategy/events.py
+# ──────────────────────────────────────────
+"""
+15m 事件扫描：掩码 + argmax 直接定位第一根发生事件的 K 线，不逐根 Python 比较
+· first_touch()       : 首次触碰 OB（uptrend 看最低价、downtrend 看最高价落在 OB 内）
+· first_penetration() : 首次刺穿 OB（uptrend 最低价破底、downtrend 最高价破顶）
+· resolve_exit()      : 持仓首次触及止损 / 止盈的 K 线（看最高 / 最低价，含影线）；
+                        同一根同时触及两者时按需下钻到低周期 K 线判先后
+输入为 CandleSeries（或 [[ts,o,h,l,c]] 列表），返回序号；没有发生 → None
+回测只需在这些序号处进入状态机的对应分支
+"""
+# ──────────────────────────────────────────
+import numpy as np
+from candles import as_ohlc
+from config  import FIXED_RISK_USD, TP_RATIO
+
+def first_true(mask, start:int=0):
+    """mask[start:] 中第一个 True 的序号（相对整个 mask）；没有 → None"""
+    m = mask[start:]
+    if not len(m):
+        return None
+    j = int(np.argmax(m))
+    return start + j if m[j] else None
+
+def touch_mask(candles, trend:str, ob:dict):
+    _, h, l, _ = as_ohlc(candles)
+    x = l if trend == 'uptrend' else h
+    return (x >= ob['bottom']) & (x <= ob['top'])
+
+def penetration_mask(candles, trend:str, ob:dict):
+    _, h, l, _ = as_ohlc(candles)
+    return l < ob['bottom'] if trend == 'uptrend' else h > ob['top']
+
+def first_touch(candles, trend:str, ob:dict, start:int=0):
+    return first_true(touch_mask(candles, trend, ob), start)
+
+def first_penetration(candles, trend:str, ob:dict, start:int=0):
+    return first_true(penetration_mask(candles, trend, ob), start)
+
+# ═══════════════════════════════════════
+# 止盈 / 止损
+# ═══════════════════════════════════════
+def exit_masks(candles, pos:dict):
+    """→ (sl_hit, tp_hit) 两个布尔数组；多单看最低价破 SL / 最高价达 TP，空单相反"""
+    _, h, l, _ = as_ohlc(candles)
+    if pos['trend'] == 'buy':
+        return l <= pos['sl'], h >= pos['tp']
+    return h >= pos['sl'], l <= pos['tp']
+
+def resolve_exit(candles, pos:dict, start:int=0, drill=None):
+    """
+    start 起第一根触及 SL / TP 的 K 线 → (j, 'sl'|'tp')；都没触及 → (None, None)
+    drill(j) → 第 j 根对应的低周期 K 线（如 1m），仅在该根同时触及两者时调用；
+    低周期仍分不出先后、或拿不到数据时按止损处理（保守）
+    """
+    sl_hit, tp_hit = exit_masks(candles, pos)
+    j = first_true(sl_hit | tp_hit, start)
+    if j is None:
+        return None, None
+    if not (sl_hit[j] and tp_hit[j]):
+        return j, 'sl' if sl_hit[j] else 'tp'
+    sub = drill(j) if drill else None
+    if sub is not None and len(sub):
+        _, hit = resolve_exit(sub, pos)
+        if hit == 'tp':
+            return j, 'tp'
+    return j, 'sl'
+
+def exit_profit(hit:str, risk_usd:float=FIXED_RISK_USD, tp_ratio:float=TP_RATIO):
+    """固定风险：止损亏 risk_usd，止盈赚 risk_usd × tp_ratio（默认取 config）"""
+    return risk_usd * tp_ratio if hit == 'tp' else -risk_usd
@@ -0,0 +1,74 @@
+# okx_quant_strategy/http_session.py
+# ──────────────────────────────────────────
+"""
+共享 HTTP 连接池（所有 okx_api 拉取函数共用一个 Session）
+· 每个 host 一个 keep-alive 连接池，池大小由 config.HTTP_POOL_SIZE 控制
+· 默认声明 gzip，响应由 urllib3 自动解压
+· session_stats() 汇总连接复用情况，用来确认轮询中已无重复握手
+"""
+# ──────────────────────────────────────────
+import threading, requests
+from requests.adapters import HTTPAdapter
+from config import HTTP_POOL_SIZE, HTTP_POOL_HOSTS
+
+_lock    = threading.Lock()
+_session = None
+_adapter = None
+
+def configure(pool_size:int=HTTP_POOL_SIZE, pool_hosts:int=HTTP_POOL_HOSTS):
+    """
+    (重新) 建立共享 Session
+      pool_size  : 单个 host 最多保持的空闲连接数（≥ 并发线程数）
+      pool_hosts : 缓存多少个 host 的连接池
+    """
+    global _session, _adapter
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _adapter = HTTPAdapter(pool_connections=pool_hosts,
+                               pool_maxsize=pool_size)
+        _session = requests.Session()
+        _session.mount("https://", _adapter)
+        _session.mount("http://",  _adapter)
+        _session.headers.update({"Accept-Encoding": "gzip, deflate",
+                                 "Connection": "keep-alive"})
+    return _session
+
+def reset():
+    """
+    fork 出的子进程里调用：丢弃继承来的 Session（不 close，套接字仍归父进程），
+    锁一并重建，下次 get_session() 在本进程新建连接
+    """
+    global _lock, _session, _adapter
+    _lock, _session, _adapter = threading.Lock(), None, None
+
+def get_session():
+    if _session is None:
+        configure()
+    return _session
+
+def _pools():
+    managers = [_adapter.poolmanager, *_adapter.proxy_manager.values()]
+    for m in managers:
+        for key in list(m.pools.keys()):
+            pool = m.pools.get(key)
+            if pool is not None:
+                yield pool
+
+def session_stats():
+    """
+    连接复用统计：
+      hosts        当前缓存的 host 连接池数
+      requests     已发请求数
+      connections  新建 TCP / TLS 连接数
+      reused       复用已有连接的请求数
+    """
+    if _adapter is None:
+        return {"hosts": 0, "requests": 0, "connections": 0, "reused": 0}
+    hosts = reqs = conns = 0
+    for pool in _pools():
+        hosts += 1
+        reqs  += pool.num_requests
+        conns += pool.num_connections
+    return {"hosts": hosts, "requests": reqs,
+            "connections": conns, "reused": max(0, reqs - conns)}
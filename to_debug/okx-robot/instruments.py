@@ -0,0 +1,115 @@
+# okx_quant_strategy/instruments.py
+# ──────────────────────────────────────────
+"""
+合约元数据注册表：instId -> {tickSz, lotSz, ctVal, minSz}
+· 一次请求拉全部 SWAP 合约，落盘 JSON（带 TTL），重启直接读盘
+· 进程内 dict，O(1) 查询；get() 只读内存表、从不等网络（推送模式在事件循环里调用）
+· warm() 在事件循环启动前阻塞备好合约表；之后过期 / 遇到未知合约
+  交给后台线程整表刷新（最多每分钟一次），刷新完整表替换，读者无需加锁
+· 拉取函数由 okx_api 注入，本模块不直接发请求
+"""
+# ──────────────────────────────────────────
+import os, json, time, threading
+from config import INSTRUMENT_CACHE_FILE, INSTRUMENT_TTL_HOURS
+from logger import logger
+
+FIELDS          = ("tickSz", "lotSz", "ctVal", "minSz")
+MISS_REFRESH_S  = 60             # 未知合约触发整表刷新的最小间隔
+
+
+class InstrumentRegistry:
+    def __init__(self, fetch_all, path:str=INSTRUMENT_CACHE_FILE,
+                 ttl_hours:float=INSTRUMENT_TTL_HOURS):
+        """fetch_all() → OKX /public/instruments 的 data 列表"""
+        self.fetch_all = fetch_all
+        self.path      = path
+        self.ttl_ms    = int(ttl_hours * 3600_000)
+        self.specs     = {}
+        self.stamp     = 0           # 数据拉取时间（ms）
+        self._last_try = 0.0
+        self._warmed   = False
+        self._bg       = None        # 进行中的后台刷新线程
+        self._lock     = threading.Lock()
+
+    # ---------- 磁盘 ----------
+    def _load_disk(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                js = json.load(f)
+            self.specs, self.stamp = js["data"], js["ts"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"[合约表] 读取 {self.path} 失败: {e!r}")
+
+    def _save_disk(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ts": self.stamp, "data": self.specs}, f)
+        os.replace(tmp, self.path)
+
+    # ---------- 刷新 ----------
+    def refresh(self):
+        """整表重拉；失败（空）时保留旧表"""
+        self._last_try = time.time()
+        rows = self.fetch_all()
+        if not rows:
+            logger.warning("[合约表] 拉取为空，沿用旧表")
+            return
+        self.specs = {d["instId"]: {k: float(d[k]) for k in FIELDS if d.get(k)}
+                      for d in rows}
+        self.stamp = int(time.time()*1000)
+        self._save_disk()
+        logger.info(f"[合约表] 已刷新 {len(self.specs)} 个合约")
+
+    def _stale(self):
+        return int(time.time()*1000) - self.stamp > self.ttl_ms
+
+    def warm(self):
+        """阻塞备好合约表：读盘，为空或过期则重拉（事件循环启动前调用）"""
+        with self._lock:
+            if not self.specs:
+                self._load_disk()
+            if self._stale():
+                self.refresh()
+            self._warmed = True
+
+    def refresh_async(self):
+        """后台线程整表重拉；已有一个在跑则不重复"""
+        with self._lock:
+            if self._bg is not None and self._bg.is_alive():
+                return
+            self._last_try = time.time()
+            self._bg = threading.Thread(target=self._refresh_bg,
+                                        name="instruments", daemon=True)
+            self._bg.start()
+
+    def after_fork(self):
+        """fork 出的子进程里调用：父进程的后台刷新线程不会跟过来，锁可能停在加锁状态"""
+        self._lock, self._bg = threading.Lock(), None
+
+    def _refresh_bg(self):
+        try:
+            with self._lock:
+                self.refresh()
+        except Exception as e:
+            logger.warning(f"[合约表] 后台刷新失败: {e!r}")
+
+    # ---------- 查询 ----------
+    def get(self, symbol:str):
+        """
+        → {tickSz, lotSz, ctVal, minSz}；只读内存表，未知合约立即抛 KeyError
+        表已过期或缺该合约（可能新上线）→ 交给后台刷新，本次不等
+        从未 warm 过（脚本 / 回测直接查询）才当场阻塞 warm 一次
+        """
+        if not self._warmed:
+            self.warm()
+        specs = self.specs
+        if (symbol not in specs or self._stale()) and \
+           time.time() - self._last_try >= MISS_REFRESH_S:
+            self.refresh_async()
+        return specs[symbol]
+
+    def symbols(self):
+        self.warm()
+        return list(self.specs)
@@ -36,14 +36,25 @@ def main():
 if __name__ == "__main__":
     main()'''
 # okx_quant_strategy/quant_main.py
-import time, math, threading
+import sys, time, math, threading, asyncio
+import numpy as np
+from collections import deque
 from datetime import datetime, timedelta
 
 from config         import MAX_OPEN_POSITIONS
-from okx_api        import fetch_usdt_contracts, fetch_kline          # 15m / 4H k线
-from strategy_4h    import analyze_4h, build_order_block
+from okx_api        import fetch_kline, warm_instruments              # 15m / 4H k线
+from async_okx_api  import (
+    fetch_kline as afetch_kline, fetch_4h_with_ts as afetch_4h_with_ts,
+    fetch_15m as afetch_15m, gather_symbols
+)
+from candle_feed    import OKXCandleFeed, ReplayCandleFeed
+from candle_store   import BAR_MS, CandleStore
+from universe       import select_universe, UniverseRefresher
+from http_session   import session_stats
+from strategy_4h    import Structure4H, analyze_4h_batch
 from strategy_15m   import Trend15State
-from risk_control   import active_positions, cancel_position, is_in_cooldown
+from risk_control   import (active_positions, cancel_position, is_in_cooldown, set_cooldown,
+                            DEFAULT_CTX)
 from logger         import logger, log_message
 
 FOUR_H_WINDOW   = 120         # 4h 近 120 根
@@ -56,32 +67,55 @@ class SymbolTracker:
     """
     维护单币种所有状态：
       · latest_4h_ts  记录已处理的最后一根 4H 收盘
+      · s4            4H 增量结构引擎（只喂已收盘 K 线，last_ts['4H'] 去重），
+                      只看最近 FOUR_H_WINDOW 根
       · four_info     最新趋势 & OB
       · t15_state     当前 15m 子状态机 (Trend15State) or None
+      · ctx           持仓 / 冷却上下文；推送模式下 clock_ms 随事件收盘时间推进
     """
-    def __init__(self, symbol):
+    def __init__(self, symbol, ctx=None):
         self.symbol = symbol
+        self.ctx = ctx or DEFAULT_CTX
         self.latest_4h_ts = 0
-        self.four_info = None        # (trend_info, ob)
+        self.s4 = Structure4H(window=FOUR_H_WINDOW)
+        self.last_ts = {'4H': 0, '15m': 0}
+        self.four_info = None        # (trend, trend_info, ob)
         self.t15_state = None
-        self.cooldown_until = 0
 
     # — 每 4 小时调用 ——————————————————
     def update_4h(self):
-        if time.time()*1000 < self.cooldown_until:
+        if is_in_cooldown(self.symbol, self.ctx):
             return
-
-        kl4 = fetch_kline(self.symbol, "4H", FOUR_H_WINDOW)
-        if len(kl4) < 120:
+        self._feed_4h(fetch_kline(self.symbol, "4H", FOUR_H_WINDOW+1, as_series=True))
+        self._on_4h()
+
+    async def update_4h_async(self, analyze=True):
+        """analyze=False：只喂 K 线，由 analyze_4h_round 统一批量分析；冷却中 → False"""
+        if is_in_cooldown(self.symbol, self.ctx):
+            return False
+        self._feed_4h(await afetch_kline(self.symbol, "4H", FOUR_H_WINDOW+1,
+                                         as_series=True))
+        if analyze:
+            self._on_4h()
+        return True
+
+    def _feed_4h(self, kl4, now_ms=None):
+        """轮询结果（多拉一根：含未收盘的最新一根）→ 只把新的已收盘 4H 喂给 s4"""
+        now_ms = time.time()*1000 if now_ms is None else now_ms
+        for ts, o, h, l, c in kl4:
+            if ts > self.last_ts['4H'] and ts + BAR_MS['4H'] <= now_ms:
+                self.s4.push((o, h, l, c))
+                self.last_ts['4H'] = ts
+
+    def _on_4h(self, result=None):
+        """result: 批量分析给出的 (trend, info, ob)；缺省取 s4.analyze()"""
+        if len(self.s4) < FOUR_H_WINDOW:
             log_message(f"[4H] {self.symbol} 数据不足")
             return
 
-        trend, info = analyze_4h(kl4)
+        trend, info, ob = result or self.s4.analyze()
         if not trend:
             return
-        ob = build_order_block(kl4, info, trend)
-        if not ob:
-            return
 
         self.latest_4h_ts = int(time.time()//FOUR_H_SECONDS)*FOUR_H_SECONDS*1000
         self.four_info = (trend, info, ob)
@@ -89,43 +123,113 @@ class SymbolTracker:
 
         # 若 4h 趋势/OB 改变，取消旧 15m 状态 & 挂单
         if self.t15_state:
-            cancel_position(self.symbol)
+            cancel_position(self.symbol, self.ctx)
             self.t15_state = None
 
     # — 每 15 分钟调用 ——————————————————
     def update_15m(self):
-        if not self.four_info:
+        if not self._ready_15m():
+            return
+        k = self._new_15m(fetch_kline(self.symbol, "15m", 2, as_series=True))
+        if k is None:
+            return
+        history = None
+        if not self.t15_state and self._touches_ob(k):
+            # 补齐触碰点及之前共 100 根已收盘 K 线作为历史
+            history = self._closed_15m(
+                fetch_kline(self.symbol, "15m", 101, as_series=True))[-100:]
+        self._on_15m(k, history)
+
+    async def update_15m_async(self):
+        if not self._ready_15m():
             return
-        if time.time()*1000 < self.cooldown_until:
+        k = self._new_15m(await afetch_kline(self.symbol, "15m", 2, as_series=True))
+        if k is None:
             return
+        history = None
+        if not self.t15_state and self._touches_ob(k):
+            history = self._closed_15m(
+                await afetch_kline(self.symbol, "15m", 101, as_series=True))[-100:]
+        self._on_15m(k, history)
+
+    @staticmethod
+    def _closed_15m(kl, now_ms=None):
+        """轮询结果（含未收盘的最新一根）→ 已收盘的 [[ts,o,h,l,c], ...]"""
+        now_ms = time.time()*1000 if now_ms is None else now_ms
+        return [list(r) for r in kl if r[0] + BAR_MS['15m'] <= now_ms]
+
+    def _new_15m(self, kl, now_ms=None):
+        """最近一根已收盘 15m [ts,o,h,l,c]；已处理过（同一根）→ None"""
+        closed = self._closed_15m(kl, now_ms)
+        if not closed or closed[-1][0] <= self.last_ts['15m']:
+            return None
+        self.last_ts['15m'] = closed[-1][0]
+        return closed[-1]
+
+    def _ready_15m(self):
+        """有 4H 结论且不在冷却（按 ctx.now_ms()：轮询为系统时间，推送为事件收盘时间）"""
+        return self.four_info and not is_in_cooldown(self.symbol, self.ctx)
+
+    def _touches_ob(self, k):
+        trend, info, ob = self.four_info
+        _, o, h, l, c = k
+        return (trend=='uptrend'   and ob['bottom']<=l<=ob['top']) or \
+               (trend=='downtrend' and ob['bottom']<=h<=ob['top'])
 
+    def _on_15m(self, k, history):
         trend, info, ob = self.four_info
 
         if not self.t15_state:
-            # 判断是否首次触碰
-            k = fetch_kline(self.symbol, "15m", 1)[0]   # 最新一根
-            _, o, h, l, c = k
-            if (trend=='uptrend'   and ob['bottom']<=l<=ob['top']) or \
-               (trend=='downtrend' and ob['bottom']<=h<=ob['top']):
-                # 补齐触碰点之前 100 根作为历史
-                history = fetch_kline(self.symbol, "15m", 100)
+            # 判断是否首次触碰（history 仅在触碰时拉取）
+            if history is not None:
                 self.t15_state = Trend15State(
-                    self.symbol, ob, trend, k[0], history)
+                    self.symbol, ob, trend, k[0], history, ctx=self.ctx)
                 logger.info(f"[15m] {self.symbol} 首次触碰 OB, 启动跟踪")
             return
 
         # 若已有子状态机 → 喂入最新 k 线
-        k = fetch_kline(self.symbol, "15m", 1)[0]
         self.t15_state.update(k)
 
         # 穿透 OB ⇒ 冷却
         _, o, h, l, c = k
         if (trend=='uptrend' and l < ob['bottom']) or \
            (trend=='downtrend' and h > ob['top']):
-            cancel_position(self.symbol)
+            cancel_position(self.symbol, self.ctx)
             self.t15_state = None
-            self.cooldown_until = k[0] + 24*3600*1000
-            logger.info(f"[冷却] {self.symbol} 穿透 OB，休眠 24h")
+            set_cooldown(self.symbol, ctx=self.ctx)
+            logger.info(f"[冷却] {self.symbol} 穿透 OB，休眠 {self.ctx.cooldown_hours}h")
+
+    # — 推送模式（candle_feed 收盘事件驱动）————————
+    def seed(self, kl4, ts4, kl15):
+        """
+        推送模式启动时灌入已收盘历史：
+          kl4 / ts4 : 4H [o,h,l,c] 与开盘时间；kl15 : 15m [ts,o,h,l,c]
+        """
+        self.s4.extend(kl4)
+        self.kl15 = deque(kl15, maxlen=100)
+        self.last_ts = {'4H':  ts4[-1] if ts4 else 0,
+                        '15m': kl15[-1][0] if kl15 else 0}
+
+    def on_candle(self, ev):
+        """CandleEvent(已收盘) → 与轮询模式相同的 _on_4h / _on_15m"""
+        ts = ev.candle[0]
+        if ts <= self.last_ts.get(ev.bar, 0):           # 重复 / 迟到推送
+            return
+        self.last_ts[ev.bar] = ts
+        close_ms = ts + BAR_MS[ev.bar]
+        self.ctx.clock_ms = close_ms                    # 冷却判定 / 设定、开仓时间都按事件收盘时间
+        if ev.bar == '4H':
+            self.s4.push(ev.candle[1:])
+            if not is_in_cooldown(self.symbol, self.ctx):
+                self._on_4h()
+        elif ev.bar == '15m':
+            k = ev.candle
+            self.kl15.append(k)
+            if not self._ready_15m():
+                return
+            history = list(self.kl15) \
+                      if not self.t15_state and self._touches_ob(k) else None
+            self._on_15m(k, history)
 
 # ——————————————————————————————————————————
 def align_sleep(seconds):
@@ -136,11 +240,134 @@ def align_sleep(seconds):
     delta = seconds - (now.timestamp() % seconds)
     time.sleep(delta)
 
-def main():
-    symbols = fetch_usdt_contracts()[:200]
-    logger.info(f"[主程序] 载入 {len(symbols)} 个 USDT-SWAP")
-
+async def poll_round(trackers, which:str):
+    """
+    对全部币种并发执行一轮 update_4h / update_15m（which = '4h' / '15m'）
+    拉取并发受 async_okx_api 的 Semaphore 约束；状态更新都在事件循环线程内
+    4h 轮只拉取喂入，拉完后全部币种一次批量分析（analyze_4h_round）
+    """
+    coros = {s: (tr.update_4h_async(analyze=False) if which=='4h'
+                 else tr.update_15m_async())
+             for s, tr in trackers.items()}
+    fed = []
+    for sym, r in (await gather_symbols(coros)).items():
+        if isinstance(r, Exception):
+            logger.error(f"[{which}轮询异常] {sym}: {r!r}")
+        elif r is True:
+            fed.append(trackers[sym])
+    if which == '4h':
+        analyze_4h_round(fed)
+
+def analyze_4h_round(trackers):
+    """
+    一轮 4H 轮询后：已满 FOUR_H_WINDOW 根的 tracker 把窗口堆成
+    (币种 × FOUR_H_WINDOW) 矩阵，analyze_4h_batch 一次算完再各自 _on_4h
+    """
+    ready = [tr for tr in trackers if len(tr.s4) >= FOUR_H_WINDOW]
+    for tr in trackers:
+        if len(tr.s4) < FOUR_H_WINDOW:
+            tr._on_4h()                                  # 记“数据不足”
+    if not ready:
+        return
+    o, h, l, c = (np.array([getattr(tr.s4, k) for tr in ready]) for k in "ohlc")
+    res = analyze_4h_batch([tr.symbol for tr in ready], o=o, h=h, l=l, c=c,
+                           pad=np.zeros(len(ready), np.int64))
+    for tr in ready:
+        tr._on_4h(res[tr.symbol])
+
+def refresh_universe(trackers, refresher):
+    """
+    按 24h 成交额刷新币种池：新增币种建 tracker；
+    跌出币种池且无持仓 / 无 15m 跟踪的 tracker 移除（有的等下次刷新再看）
+    """
+    added, _ = refresher.refresh()
+    for s in added:
+        trackers[s] = SymbolTracker(s)
+    keep = set(refresher.symbols)
+    for s in [s for s in trackers if s not in keep]:
+        if not trackers[s].t15_state and s not in active_positions:
+            trackers.pop(s)
+
+def trim_excess_positions():
+    """风控：同时持仓不得超过 MAX_OPEN_POSITIONS，平掉最早的多余持仓"""
+    if len(active_positions) > MAX_OPEN_POSITIONS:
+        excess = len(active_positions) - MAX_OPEN_POSITIONS
+        for sym in list(active_positions.keys())[:excess]:
+            cancel_position(sym)
+            logger.info(f"[风控] 平掉 {sym} 多余持仓")
+
+async def seed_trackers(trackers, end_ts:int=None, store:CandleStore=None):
+    """
+    推送模式启动：并发从本地仓库（缺口走 REST）灌入截至 end_ts 的历史
+    store 给定时（回放）只读该仓库，不联网
+    """
+    end_ts = int(time.time()*1000) if end_ts is None else end_ts
+
+    if store is not None:
+        for tr in trackers.values():
+            ts4, *ohlc4 = store.load(tr.symbol, "4H", 0, end_ts - BAR_MS['4H'])
+            kl4 = [list(map(float, r)) for r in zip(*ohlc4)][-FOUR_H_WINDOW:]
+            ts4 = [int(t) for t in ts4[-FOUR_H_WINDOW:]]
+            kl15 = [[int(r[0])] + list(map(float, r[1:])) for r in zip(*store.load(
+                tr.symbol, "15m", end_ts - 100*FIFTEEN_SECONDS*1000,
+                end_ts - BAR_MS['15m']))]
+            tr.seed(kl4, ts4, kl15)
+        return
+
+    async def one(tr):
+        kl4, ts4 = await afetch_4h_with_ts(tr.symbol, FOUR_H_WINDOW, end_ts)
+        kl15 = await afetch_15m(tr.symbol, end_ts - 100*FIFTEEN_SECONDS*1000,
+                                end_ts - 1)
+        tr.seed(kl4, ts4, kl15)
+
+    await gather_symbols({s: one(tr) for s, tr in trackers.items()})
+
+async def run_stream(feed, trackers):
+    """
+    推送模式主循环：每个已收盘 K 线事件驱动对应币种，
+    每根 15m 收盘后做一次全局持仓风控
+    """
+    async for ev in feed:
+        tr = trackers.get(ev.symbol)
+        if tr is None:
+            continue
+        try:
+            tr.on_candle(ev)
+        except Exception as e:
+            logger.error(f"[推送异常] {ev.symbol} {ev.bar}: {e!r}")
+        if ev.bar == '15m':
+            trim_excess_positions()
+
+def main_stream(replay:tuple=None):
+    """
+    replay=None          : 连 OKX wss 推送
+    replay=(start, end)  : 离线回放本地仓库 [start, end] 的 K 线；
+                           币种池取仓库里 4H、15m 都覆盖到该区间的币种，不联网
+    """
+    store = CandleStore() if replay else None
+    if replay:
+        symbols = sorted(set(store.symbols("4H", *replay)) &
+                         set(store.symbols("15m", *replay)))
+        feed    = ReplayCandleFeed(symbols, *replay, store=store)
+    else:
+        symbols = select_universe()
+        feed    = OKXCandleFeed(symbols)
     trackers = {s: SymbolTracker(s) for s in symbols}
+    warm_instruments()                  # 下单取精度在事件循环里，只能读内存表
+
+    async def run():
+        await seed_trackers(trackers, replay[0] if replay else None, store)
+        logger.info(f"[主程序] 推送模式载入 {len(symbols)} 个 USDT-SWAP")
+        await run_stream(feed, trackers)
+
+    asyncio.run(run())
+
+def main():
+    refresher = UniverseRefresher()
+    trackers  = {}
+    refresh_universe(trackers, refresher)
+    warm_instruments()                  # 轮询轮次同样跑在事件循环里
+    logger.info(f"[主程序] 载入 {len(trackers)} 个 USDT-SWAP")
 
     # ① 先对齐到最近的 15m 边界
     align_sleep(FIFTEEN_SECONDS)
@@ -154,27 +381,32 @@ def main():
 
         # — A. 4H 轮询（整 4h 边界触发）
         if sec_now - fourh_boundary < 5:
+            if refresher.due():
+                refresh_universe(trackers, refresher)
             logger.info("[4H轮询] 开始")
-            for tr in trackers.values():
-                tr.update_4h()
+            asyncio.run(poll_round(trackers, '4h'))
 
         # — B. 15m 轮询（整 15m 边界触发）
         if sec_now - fifteen_boundary < 5:
             logger.info("[15m轮询] 开始")
-            for tr in trackers.values():
-                tr.update_15m()
+            asyncio.run(poll_round(trackers, '15m'))
+            logger.info(f"[HTTP] 连接复用 {session_stats()}")
 
         # — C. 风控：同时持仓不得超过 5
-        if len(active_positions) > MAX_OPEN_POSITIONS:
-            # 平掉最早的多余持仓
-            excess = len(active_positions) - MAX_OPEN_POSITIONS
-            for sym in list(active_positions.keys())[:excess]:
-                cancel_position(sym)
-                logger.info(f"[风控] 平掉 {sym} 多余持仓")
+        trim_excess_positions()
 
         # 睡到下一分钟
         time.sleep(10)
 
 if __name__ == "__main__":
-    main()
+    # python main.py                       轮询模式
+    # python main.py --stream              OKX 推送模式
+    # python main.py --replay START END    离线回放（毫秒时间戳）
+    if "--stream" in sys.argv:
+        main_stream()
+    elif "--replay" in sys.argv:
+        i = sys.argv.index("--replay")
+        main_stream((int(sys.argv[i+1]), int(sys.argv[i+2])))
+    else:
+        main()
 
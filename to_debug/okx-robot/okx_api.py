@@ -3,21 +3,33 @@
 """
 统一行情 / 下单接口（只保留一次定义）
 · 支持 PROXIES 可选 SOCKS5
-· _safe_get() 带指数退避 + 动态减包
+· _safe_get() 带指数退避 + 动态减包，走 http_session 共享连接池
+· 每次请求先向 rate_limiter 按接口取令牌，不再手写 sleep 节流
 · 提供：
     fetch_usdt_contracts()   # 合约列表
-    fetch_4h_with_ts()       # 4H → (klines, ts_list)
-    fetch_15m()              # 任意窗口 15m
+    fetch_swap_tickers()     # 全部 SWAP 24h 行情（币种池筛选）
+    fetch_4h_with_ts()       # 4H → (klines, ts_list)   本地仓库 + 缺口补齐
+    fetch_15m()              # 任意窗口 15m            本地仓库 + 缺口补齐
     fetch_kline()            # 通用单次拉 n 根 K 线（用于实盘轮询）
-    round_price()            # 对齐价格精度
+    （以上 K 线函数均可 as_series=True → candles.CandleSeries 列式序列）
+    round_price()            # 对齐价格精度   } 合约注册表，
+    round_size()             # 对齐下单张数   } 全表一次拉取 + 落盘 TTL
+    warm_instruments()       # 启动前备好合约表，之后上面两个只读内存、不等网络
+    reset_after_fork()       # 进程池子进程初始化：重建继承来的线程池 / 连接 / 锁
 """
 # ──────────────────────────────────────────
-import time, json, hmac, hashlib, base64, requests
+import time, json, hmac, hashlib, base64, threading, requests
 from datetime import datetime
 from requests.exceptions import (
     ProxyError, SSLError, ConnectionError, ReadTimeout, RequestException
 )
-from config import API_KEY, SECRET_KEY, PASSPHRASE, BASE_URL
+from concurrent.futures import ThreadPoolExecutor
+from config import API_KEY, SECRET_KEY, PASSPHRASE, BASE_URL, FETCH_CONCURRENCY
+from candle_store import CandleStore, BAR_MS
+from candles      import CandleSeries, decode_okx
+from http_session import get_session
+from instruments  import InstrumentRegistry
+import rate_limiter, http_session
 
 # ========== 网络全局设置 ==========
 HEADERS = {"User-Agent": "Mozilla/5.0"}
@@ -36,8 +48,13 @@ def _safe_get(url:str, params:dict, tag:str,
     for n in range(max_retry):
         try:
             params[limit_key] = limit
-            r = requests.get(url, headers=HEADERS, proxies=PROXIES,
-                             timeout=TIMEOUT, params=params)
+            rate_limiter.acquire(url)
+            r = get_session().get(url, headers=HEADERS, proxies=PROXIES,
+                                  timeout=TIMEOUT, params=params)
+            if r.status_code == 429:              # 超频：由限速器退让，不减包
+                rate_limiter.penalize(url, float(r.headers.get("Retry-After", 2)))
+                print(f"[{tag}] 第{n+1}次被限速(429)")
+                continue
             r.raise_for_status()
             return r.json()
         except (ProxyError, SSLError, ConnectionError,
@@ -50,77 +67,207 @@ def _safe_get(url:str, params:dict, tag:str,
 # ═══════════════════════════════════════
 # 1) 合约列表
 # ═══════════════════════════════════════
-def fetch_usdt_contracts():
+def fetch_swap_instruments():
+    """全部 SWAP 合约元数据，一次请求 → OKX data 列表"""
     url = f"{BASE_URL}/api/v5/public/instruments"
     js  = _safe_get(url, {"instType":"SWAP"}, tag="symbols")
-    return [d["instId"] for d in js.get("data", [])
-            if d["instId"].endswith("-USDT-SWAP")]
+    return js.get("data", [])
 
-# ═══════════════════════════════════════
-# 2) 4H K 线 + 时间戳
-# ═══════════════════════════════════════
-def fetch_4h_with_ts(symbol:str, bars:int=300):
-    url = f"{BASE_URL}/api/v5/market/candles"
-    js  = _safe_get(url, {"instId":symbol,"bar":"4H","limit":bars},
-                    tag=f"{symbol}-4H")
-    rows = js.get("data", [])[::-1]         # 升序
-    kls, ts = [], []
-    for r in rows:
-        ts.append(int(r[0]))
-        kls.append([float(x) for x in r[1:5]])  # O,H,L,C
-        #print("kls.length",len(kls))
-    return kls, ts
+def fetch_usdt_contracts():
+    """USDT 本位永续列表（走合约注册表，TTL 内不发请求）"""
+    return [s for s in _instruments.symbols() if s.endswith("-USDT-SWAP")]
+
+def fetch_swap_tickers():
+    """
+    全部 SWAP 的 24h 行情，一次请求 → [ticker dict, ...]
+    （last / volCcy24h 等字段为字符串，原样返回）
+    """
+    url = f"{BASE_URL}/api/v5/market/tickers"
+    js  = _safe_get(url, {"instType":"SWAP"}, tag="tickers")
+    return js.get("data", [])
 
 # ═══════════════════════════════════════
-# 3) 任意窗口 15m
+# 2) 历史 K 线：本地仓库 + 头 / 尾缺口补齐
 # ═══════════════════════════════════════
-def fetch_15m(symbol:str, start_ts:int, end_ts:int, limit:int=300):
+_store = CandleStore()
+_pager_pool = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY,
+                                 thread_name_prefix="okx-page")
+_store_locks, _store_locks_guard = {}, threading.Lock()
+
+def _store_lock(symbol:str, bar:str):
+    with _store_locks_guard:
+        return _store_locks.setdefault((symbol, bar), threading.Lock())
+
+def reset_after_fork():
+    """
+    fork 出的子进程不带父进程的线程：继承来的 _pager_pool 没有工作线程，
+    map() 会永远等下去；keep-alive Session 的套接字与父进程共用，锁也可能停在
+    加锁状态。子进程开始拉取前重建这些对象（限速桶由 rate_limiter.set_share 重建）
+    """
+    global _pager_pool, _store_locks, _store_locks_guard
+    _pager_pool = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY,
+                                     thread_name_prefix="okx-page")
+    _store_locks, _store_locks_guard = {}, threading.Lock()
+    _instruments.after_fork()
+    http_session.reset()
+
+def _fetch_window(symbol:str, bar:str, start_ts:int, end_ts:int,
+                  limit:int=100):
+    """
+    HTTP 顺序拉取 [start_ts, end_ts] 内已收盘 K 线（原始字符串行）
+    history-candles 的 after=ts 返回“早于 ts”的记录（降序），
+    因此从 end_ts 往回翻页；拿到的最早一根已是 ≥ start_ts 的第一根时停止
+    """
     url  = f"{BASE_URL}/api/v5/market/history-candles"
-    out, after = [], start_ts
-    while after <= end_ts:
-        js = _safe_get(url, {"instId":symbol,"bar":"15m",
+    last = start_ts + BAR_MS[bar] - 1              # 最早一根 ≤ last → 区间已取全
+    out, after = [], end_ts + 1
+    while after > last:
+        js = _safe_get(url, {"instId":symbol,"bar":bar,
                              "after":after,"limit":limit},
-                       tag=f"{symbol}-15m")
+                       tag=f"{symbol}-{bar}")
         rows = js.get("data", [])
         if not rows: break
-        for r in rows[::-1]:                # 保证升序追加
-            ts = int(r[0])
-            if ts > end_ts: return out
-            o,h,l,c = map(float, r[1:5])
-            out.append([ts,o,h,l,c])
-        after = int(rows[-1][0]) + 1
-        if len(rows) < limit: break
-        time.sleep(0.05)
-    return sorted(out, key=lambda x: x[0])
+        out.extend(r for r in rows
+                   if start_ts <= int(r[0]) <= end_ts
+                   and (len(r) < 9 or r[8] == "1"))   # 只要已收盘
+        after = int(rows[-1][0])
+    return out
+
+def _fetch_history_rows(symbol:str, bar:str, start_ts:int, end_ts:int,
+                        limit:int=100):
+    """
+    [start_ts, end_ts] 按固定步长（limit 根）预先切成时间窗，
+    各窗并发拉取（仍受 rate_limiter 约束），按时间倒序拼回
+    · 窗口按 K 线开盘时间对齐，每窗恰好 limit 根：正常每窗 1 次请求；
+      窗内有缺口 / 减包时该窗自行继续翻页
+    """
+    bar_ms  = BAR_MS[bar]
+    span    = limit * bar_ms
+    windows = [(max(start_ts, b - span + bar_ms), b)
+               for b in range(end_ts//bar_ms*bar_ms, start_ts - 1, -span)]
+    if len(windows) <= 1:
+        return _fetch_window(symbol, bar, start_ts, end_ts, limit)
+    pages = _pager_pool.map(lambda w: _fetch_window(symbol, bar, *w, limit),
+                            windows)
+    return [r for page in pages for r in page]
+
+def _load_candles(symbol:str, bar:str, start_ts:int, end_ts:int):
+    """
+    [start_ts, end_ts]（按开盘时间）内已收盘 K 线 → (ts,o,h,l,c) 五列，线程安全
+    · 先看本地仓库覆盖区间，只对缺失的头 / 尾区间发请求
+    · 尾部离当前不足两根 K 线时，覆盖区间只推进到实际拿到的最后一根，
+      避免交易所延迟确认造成永久缺口
+    """
+    bar_ms   = BAR_MS[bar]
+    now      = int(time.time()*1000)
+    end_ts   = min(end_ts, now//bar_ms*bar_ms - bar_ms)   # 最近一根已收盘
+    if end_ts < start_ts:
+        return _store.load(symbol, bar, start_ts, end_ts)
+
+    with _store_lock(symbol, bar):                        # 同一 (instId, bar) 串行补缺
+        cov  = _store.coverage(symbol, bar)
+        gaps = [(start_ts, end_ts)] if cov is None else \
+               [g for g in ((start_ts, cov[0]-1), (cov[1]+1, end_ts)) if g[0] <= g[1]]
+        for a, b in gaps:
+            cols = decode_okx(_fetch_history_rows(symbol, bar, a, b))
+            if b + 2*bar_ms > now:                        # 尾部未稳定
+                b = int(cols[0].max()) if len(cols[0]) else (cov[1] if cov else a - 1)
+            if b >= a:
+                _store.merge(symbol, bar, cols, a, b)
+            cov = _store.coverage(symbol, bar)
+        return _store.load(symbol, bar, start_ts, end_ts)
+
+# ═══════════════════════════════════════
+# 3) 4H K 线 + 时间戳 / 任意窗口 15m（均走本地仓库）
+# ═══════════════════════════════════════
+def fetch_4h_with_ts(symbol:str, bars:int=300, end_ts:int=None,
+                     as_series:bool=False):
+    """
+    截至 end_ts（默认当前）最近 `bars` 根已收盘 4H，升序
+      as_series=False → (klines[o,h,l,c], ts_list)
+      as_series=True  → CandleSeries（ts 在序列内）
+    """
+    bar_ms = BAR_MS["4H"]
+    end    = int(time.time()*1000) if end_ts is None else end_ts
+    end    = end//bar_ms*bar_ms - bar_ms
+    series = CandleSeries(*_load_candles(symbol, "4H", end - (bars-1)*bar_ms, end))
+    if as_series:
+        return series
+    return series.ohlc_rows(), series.ts.tolist()
+
+def fetch_15m(symbol:str, start_ts:int, end_ts:int, as_series:bool=False):
+    """
+    [start_ts, end_ts] 内已收盘 15m，升序
+      as_series=False → [[ts,o,h,l,c], ...]
+      as_series=True  → CandleSeries（mmap 视图，不拷贝）
+    """
+    series = CandleSeries(*_load_candles(symbol, "15m", start_ts, end_ts))
+    return series if as_series else series.rows()
+
+def fetch_1m(symbol:str, start_ts:int, end_ts:int, as_series:bool=False):
+    """
+    [start_ts, end_ts] 内已收盘 1m，升序
+    止盈 / 止损同根判定时按根下钻用，一次只取一根 15m 的 15 根：
+    · 连续仓库已覆盖该窗 → 直接读
+    · 否则只拉这一窗，存为稀疏窗口（CandleStore.save_window），
+      不扩展连续覆盖区间，两次下钻之间的 1m 不会被整段补齐
+    """
+    cov = _store.coverage(symbol, "1m")
+    if cov and cov[0] <= start_ts and end_ts <= cov[1]:
+        cols = _store.load(symbol, "1m", start_ts, end_ts)
+    else:
+        cols = _store.load_window(symbol, "1m", start_ts, end_ts)
+        if cols is None:
+            cols = decode_okx(_fetch_window(symbol, "1m", start_ts, end_ts))
+            if end_ts + 2*BAR_MS["1m"] <= time.time()*1000:    # 已稳定才缓存
+                _store.save_window(symbol, "1m", start_ts, end_ts, cols)
+    series = CandleSeries(*cols)
+    return series if as_series else series.rows()
 
 # ═══════════════════════════════════════
 # 4) 通用 fetch_kline（实盘轮询等用）
 # ═══════════════════════════════════════
-def fetch_kline(symbol:str, bar:str='15m', limit:int=100):
+def fetch_kline(symbol:str, bar:str='15m', limit:int=100,
+                as_series:bool=False):
     """
-    返回最近 `limit` 根（升序）  [o,h,l,c]
+    返回最近 `limit` 根（升序，含未收盘的最新一根）
+      as_series=False → [o,h,l,c]
+      as_series=True  → CandleSeries（带 ts）
     """
     url = f"{BASE_URL}/api/v5/market/candles"
     js  = _safe_get(url, {"instId":symbol,"bar":bar,"limit":limit},
                     tag=f"{symbol}-{bar}")
-    rows = js.get("data", [])[::-1]
-    return [[float(r[1]), float(r[2]), float(r[3]), float(r[4])] for r in rows]
+    series = CandleSeries.from_okx(js.get("data", []))
+    return series if as_series else series.ohlc_rows()
 
 # ═══════════════════════════════════════
 # 5) 精度工具
 # ═══════════════════════════════════════
-_tick_cache={}
+_instruments = InstrumentRegistry(fetch_swap_instruments)   # 全表一次拉取 + 落盘
+
+def warm_instruments():
+    """事件循环启动前调用：备好合约表，之后 instrument / round_* 只读内存"""
+    _instruments.warm()
+
+def instrument(symbol:str):
+    """→ {tickSz, lotSz, ctVal, minSz}"""
+    return _instruments.get(symbol)
+
 def _fetch_tick(symbol:str):
-    if symbol in _tick_cache: return _tick_cache[symbol]
-    url = f"{BASE_URL}/api/v5/public/instruments"
-    js  = _safe_get(url, {"instType":"SWAP","instId":symbol},
-                    tag=f"{symbol}-tick")
-    tick = float(js["data"][0]["tickSz"])
-    _tick_cache[symbol]=tick; return tick
+    return _instruments.get(symbol)["tickSz"]
 
 def round_price(symbol:str, price:float):
     tick=_fetch_tick(symbol); return round(price/tick)*tick
 
+def round_size(symbol:str, size:float):
+    """
+    张数向下对齐到 lotSz；不足 minSz 返回 0
+    """
+    spec = _instruments.get(symbol)
+    lot  = spec["lotSz"]
+    sz   = int(size/lot + 1e-9)*lot
+    return sz if sz >= spec.get("minSz", lot) else 0.0
+
 # 其余（签名下单等）若后续实盘需要再补，这里保持简单行情模块
 
 
@@ -0,0 +1,80 @@
+# okx_quant_strategy/rate_limiter.py
+# ──────────────────────────────────────────
+"""
+按接口划分的令牌桶限速（线程安全，所有拉取函数共用）
+· 预算取自 OKX 公共接口限速（按 IP）：次数 / 窗口秒数
+· acquire(url) 阻塞到拿到令牌为止；并发线程 / 协程共享同一预算
+· 收到 429 时 penalize(url) 清空令牌并暂停该接口
+· 多进程（回测进程池）共用同一 IP 时，各进程 set_share(1/N) 只取 1/N 预算
+"""
+# ──────────────────────────────────────────
+import time, threading
+from urllib.parse import urlparse
+
+RATE_LIMITS = {
+    "/api/v5/market/candles":         (40, 2.0),
+    "/api/v5/market/history-candles": (20, 2.0),
+    "/api/v5/public/instruments":     (20, 2.0),
+    "/api/v5/market/tickers":         (20, 2.0),
+}
+DEFAULT_LIMIT = (10, 2.0)        # 未登记接口的保守预算
+SAFETY        = 0.9              # 只用 90% 预算，给时钟误差留余量
+_share        = 1.0              # 本进程占 IP 预算的比例（set_share）
+
+
+class TokenBucket:
+    def __init__(self, limit:int, window:float):
+        budget        = limit*SAFETY*_share         # 本进程每窗可用次数，可能不足 1
+        self.capacity = max(1.0, budget)            # 至少攒得下一个令牌，否则永远拿不到
+        self.rate     = budget / window             # 每秒补充令牌：按未截断的预算算
+        self.tokens   = budget
+        self.stamp    = time.monotonic()
+        self._lock    = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now-self.stamp)*self.rate)
+        self.stamp  = now
+
+    def acquire(self, n:float=1.0):
+        """阻塞直到拿到 n 个令牌；返回等待秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return waited
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait); waited += wait
+
+    def penalize(self, seconds:float):
+        """清空令牌并记 seconds 秒的欠账：之后的 acquire 至少等待 seconds"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = -seconds * self.rate
+
+
+_buckets = {path: TokenBucket(*lim) for path, lim in RATE_LIMITS.items()}
+_buckets_lock = threading.Lock()
+
+def bucket_for(url:str):
+    path = urlparse(url).path
+    with _buckets_lock:
+        if path not in _buckets:
+            _buckets[path] = TokenBucket(*DEFAULT_LIMIT)
+        return _buckets[path]
+
+def set_share(share:float):
+    """本进程只用 share 份预算；已建的桶按新预算重建"""
+    global _share
+    with _buckets_lock:
+        _share = share
+        for path in list(_buckets):
+            _buckets[path] = TokenBucket(*RATE_LIMITS.get(path, DEFAULT_LIMIT))
+
+def acquire(url:str):
+    return bucket_for(url).acquire()
+
+def penalize(url:str, seconds:float=2.0):
+    bucket_for(url).penalize(seconds)
@@ -1,35 +1,71 @@
 # okx_quant_strategy/risk_control.py
 # ─────────────────────────────────
+"""
+风控状态：持仓 / 冷却 / 15m 状态机 都挂在 StrategyContext 上
+· 每个回测（或整个实盘进程）一个 context，互不干扰，可同进程并行
+· 下列函数都带可选 ctx，不传即作用于 DEFAULT_CTX；
+  模块级 active_positions / cooldown_until_ms 就是 DEFAULT_CTX 的字段（同一对象）
+· 策略参数 tp_ratio / risk_usd / cooldown_hours 也在 ctx 上（默认取 config），
+  参数扫描时每组参数一个 ctx
+· ctx.clock_ms 不为 None 时冷却 / 开仓时间按它计（回测的事件时间），否则取系统时间
+"""
+# ─────────────────────────────────
 import time
 from collections import defaultdict
+from config import TP_RATIO, FIXED_RISK_USD, COOLDOWN_DURATION_HOURS
 
-active_positions   = {}                # symbol -> position dict
-cooldown_until_ms  = defaultdict(int)  # symbol -> ts_ms
 MAX_OPEN_POSITIONS = 5                 # 同时挂单上限
 
-def register_position(symbol, entry, sl, tp, trend, size=0):
-    active_positions[symbol] = {
+
+class StrategyContext:
+    def __init__(self, max_positions:int=MAX_OPEN_POSITIONS, tp_ratio:float=TP_RATIO,
+                 risk_usd:float=FIXED_RISK_USD,
+                 cooldown_hours:float=COOLDOWN_DURATION_HOURS):
+        self.active_positions  = {}                # symbol -> position dict
+        self.cooldown_until_ms = defaultdict(int)  # symbol -> ts_ms
+        self.trend15_states    = {}                # symbol -> Trend15State
+        self.pending_exits     = {}                # 回测：symbol -> 已定位的出场（见 backtest_4h）
+        self.max_positions     = max_positions
+        self.tp_ratio          = tp_ratio          # 盈亏比
+        self.risk_usd          = risk_usd          # 每笔固定止损金额
+        self.cooldown_hours    = cooldown_hours    # 刺穿 OB 后的冷却
+        self.clock_ms          = None              # 回测时由驱动方推进
+
+    def now_ms(self):
+        return int(time.time()*1000) if self.clock_ms is None else self.clock_ms
+
+
+DEFAULT_CTX       = StrategyContext()
+active_positions  = DEFAULT_CTX.active_positions
+cooldown_until_ms = DEFAULT_CTX.cooldown_until_ms
+
+def register_position(symbol, entry, sl, tp, trend, size=0, ctx=None):
+    (ctx or DEFAULT_CTX).active_positions[symbol] = {
         "entry": entry, "sl": sl, "tp": tp,
         "trend": trend, "size": size,
-        "ts": int(time.time()*1000)
+        "ts": (ctx or DEFAULT_CTX).now_ms()
     }
 
-def cancel_position(symbol):
+def cancel_position(symbol, ctx=None):
     """
     删除并返回持仓；回测 / 实盘共用
     """
-    return active_positions.pop(symbol, None)
+    return (ctx or DEFAULT_CTX).active_positions.pop(symbol, None)
 
-def set_cooldown(symbol, hours=24):
-    cooldown_until_ms[symbol] = int(time.time()*1000) + hours*3600*1000
+def set_cooldown(symbol, hours=None, ctx=None):
+    """hours 缺省取 ctx.cooldown_hours"""
+    ctx = ctx or DEFAULT_CTX
+    hours = ctx.cooldown_hours if hours is None else hours
+    ctx.cooldown_until_ms[symbol] = ctx.now_ms() + hours*3600*1000
 
-def is_in_cooldown(symbol):
-    return time.time()*1000 < cooldown_until_ms[symbol]
+def is_in_cooldown(symbol, ctx=None):
+    ctx = ctx or DEFAULT_CTX
+    return ctx.now_ms() < ctx.cooldown_until_ms[symbol]
 
-def can_open_new_position(symbol):
+def can_open_new_position(symbol, ctx=None):
     """
     是否允许新挂单：① 全局未超上限；② 符合冷却
     """
-    return (len(active_positions) < MAX_OPEN_POSITIONS) and (not is_in_cooldown(symbol))
-
-
+    ctx = ctx or DEFAULT_CTX
+    return (len(ctx.active_positions) < ctx.max_positions) and \
+           (not is_in_cooldown(symbol, ctx))
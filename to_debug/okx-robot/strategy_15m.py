@@ -2,51 +2,91 @@
 # ──────────────────────────────────────────
 """
 15 m 状态机（维持原有高低点 / 趋势过滤等全部规则）
-  · 仅在 update() 开头增加止盈 / 止损检测
+  · 仅在 update() 开头增加止盈 / 止损检测：按本根最高 / 最低价判定（含影线），
+    同根同时触及 SL / TP 时按止损处理（保守）；实盘在事件循环里跑，不做阻塞的
+    1m 下钻，下钻只在回测整段定位出场时做（backtest_4h.locate_exit）
+    manage_exits=False 时不检测，由调用方（回测）整段定位出场
+  · 持仓 / 冷却读写 ctx（risk_control.StrategyContext），默认 DEFAULT_CTX；
+    盈亏比 / 固定风险 / 冷却时长也取自 ctx
+  · K 线存于定长 CandleRing（TREND15_BUFFER_SIZE 根），HL / HH 等结构点的
+    下标为绝对序号，旧 K 线淘汰后仍有效
+  · 状态为 __slots__ 定长字段；候选 HL / LH 只记滚动极值，
+    每根 update() 常数时间、不随历史增长
 """
 # ──────────────────────────────────────────
 import time
-from utils   import build_trend, find_highs_lows_15m
+from utils   import build_trend, find_highs_lows_15m, BodyIndex
 from logger  import log_message, log_trade
-from okx_api import round_price
+from okx_api import round_price, round_size, instrument
+from candles import as_rows, CandleRing
+from events  import resolve_exit, exit_profit
+from config  import TREND15_BUFFER_SIZE
 from risk_control import (
-    active_positions, can_open_new_position,
+    DEFAULT_CTX, can_open_new_position,
     register_position, cancel_position, set_cooldown
 )
 
-trend15_states = {}          # 外部可直接访问全部状态
+trend15_states = DEFAULT_CTX.trend15_states   # 外部可直接访问全部状态
 
 # ═══════════════════════════════════════
 class Trend15State:
+    __slots__ = ("symbol", "ob", "main_trend", "ref_ts", "trend",
+                 "kline_buffer", "bodies", "ll", "lh", "hl", "hh",
+                 "ob_touched", "exchange_trend", "order_sent", "manage_exits", "ctx",
+                 "_prev2", "_prev",                # 上上根 / 上一根 K 线
+                 "_hl_i", "_hl_v", "_lh_i", "_lh_v",   # 候选 HL 最低 / LH 最高（序号, 价）
+                 "_touch", "_scanned")             # 最早触碰 OB 的序号 / 已扫描到的序号
+
     def __init__(self, symbol, ob, main_trend,
-                 ref_ts, kline_history):
+                 ref_ts, kline_history, manage_exits=True, ctx=None):
         self.symbol      = symbol
         self.ob          = ob
         self.main_trend  = main_trend          # 上级 4 h 趋势
         self.ref_ts      = ref_ts
         self.trend       = 'downtrend' if main_trend=='uptrend' else 'uptrend'
 
-        self.kline_buffer = kline_history[:]   # 升序
+        rows = as_rows(kline_history)             # 升序 [[ts,o,h,l,c]]，可为 CandleSeries
+        self.kline_buffer = CandleRing(TREND15_BUFFER_SIZE, rows)
+        self.bodies       = BodyIndex([k[1] for k in rows], [k[4] for k in rows],
+                                      capacity=TREND15_BUFFER_SIZE)
         self.ll=self.lh=self.hl=self.hh=None
         self.ob_touched   = False
         self.exchange_trend=False
         self.order_sent   = False
-        self.hl_candidates=[]; self.lh_candidates=[]
+        self.manage_exits = manage_exits
+        self.ctx          = ctx or DEFAULT_CTX
+        self._prev2, self._prev = ([None, None] + rows[-2:])[-2:]
+        self._hl_i=self._hl_v=self._lh_i=self._lh_v=None
+        self._touch=None; self._scanned=0
 
         self._init_structure()
 
     # ---------- 找触碰点并初始化高低点 ----------
+    def _find_touch(self):
+        """
+        缓冲内最早触碰 OB 的序号；没有 → None
+        已扫描过的 K 线不再重扫（K 线不会变），最早触碰点被淘汰时从其后继续
+        """
+        buf = self.kline_buffer
+        if self._touch is not None and self._touch >= buf.start:
+            return self._touch
+        self._touch = None
+        for i in range(max(self._scanned, buf.start), buf.end):
+            _,_,h,l,_ = buf[i]
+            if (self.main_trend=='uptrend' and self.ob['bottom']<=l<=self.ob['top']) or \
+               (self.main_trend=='downtrend' and self.ob['bottom']<=h<=self.ob['top']):
+                self._touch, self._scanned = i, i+1
+                return i
+        self._scanned = buf.end
+        return None
+
     def _init_structure(self):
-        for i,k in enumerate(self.kline_buffer):
-            _,_,h,l,_ = k
-            if self.main_trend=='uptrend' and self.ob['bottom']<=l<=self.ob['top']:
-                self.ob_touched=True; start=i; break
-            if self.main_trend=='downtrend' and self.ob['bottom']<=h<=self.ob['top']:
-                self.ob_touched=True; start=i; break
-        else:
+        start = self._find_touch()
+        if start is None:
             return
-        pts = find_highs_lows_15m(self.kline_buffer[start:], self.main_trend, start)
-        tr, info = build_trend(pts)
+        self.ob_touched=True
+        pts = find_highs_lows_15m(self.kline_buffer.series(start), self.main_trend, start)
+        tr, info = build_trend(pts, compact=True)
         if self.main_trend=='uptrend':
             self.lh, self.ll = info.get('lh'), info.get('ll')
             self.trend='downtrend'
@@ -59,17 +99,20 @@ class Trend15State:
         # ★★★★★★★★★★★★★★★★★★★★★★
         # ★  1) 止盈 / 止损检测  (新增)  ★
         # ★★★★★★★★★★★★★★★★★★★★★★
-        pos = active_positions.get(self.symbol)                        # ★新增
+        pos = self.ctx.active_positions.get(self.symbol) if self.manage_exits else None
         if pos:                                                        # ★新增
-            hit, prof = self._check_exit(k[4], pos)                    # ★新增
+            hit, prof = self._check_exit(k, pos)                       # ★新增
             if hit:                                                    # ★新增
-                cancel_position(self.symbol)                           # ★新增
+                cancel_position(self.symbol, self.ctx)                 # ★新增
                 log_trade(self.symbol, pos['trend'],                   # ★新增
                           pos['entry'], pos['sl'], pos['tp'], prof)    # ★新增
                 self.order_sent = False                                # ★新增
         # ---------- 原逻辑开始 ----------
         ts,o,h,l,c = k
         self.kline_buffer.append(k)
+        self.bodies.push(o, c)
+        p3, prev = self._prev2, self._prev     # 本根之前的两根
+        self._prev2, self._prev = prev, k
 
         # 若尚未触碰 OB，再检查一次
         if not self.ob_touched:
@@ -78,99 +121,117 @@ class Trend15State:
 
         # ① 实体穿透 OB → 冷却
         if self.main_trend=='uptrend' and l < self.ob['bottom']:
-            cancel_position(self.symbol); set_cooldown(self.symbol,24)
+            cancel_position(self.symbol, self.ctx); set_cooldown(self.symbol, ctx=self.ctx)
             self.ob_touched=False; return
         if self.main_trend=='downtrend' and h > self.ob['top']:
-            cancel_position(self.symbol); set_cooldown(self.symbol,24)
+            cancel_position(self.symbol, self.ctx); set_cooldown(self.symbol, ctx=self.ctx)
             self.ob_touched=False; return
 
         # ② 结构破坏 → 趋势翻转 + 挂单
         if self.trend=='downtrend' and self.lh and c > self.lh[2]:
             if self.exchange_trend:
-                cancel_position(self.symbol); self.ob_touched=False; return
+                cancel_position(self.symbol, self.ctx); self.ob_touched=False; return
             self.trend='uptrend'; self.exchange_trend=True
-            self.hl=self.ll; self.hh=(len(self.kline_buffer)-1,'high',h)
+            self.hl=self.ll; self.hh=(self.kline_buffer.end-1,'high',h)
             self._try_order('buy')
         elif self.trend=='uptrend' and self.hl and c < self.hl[2]:
             if self.exchange_trend:
-                cancel_position(self.symbol); self.ob_touched=False; return
+                cancel_position(self.symbol, self.ctx); self.ob_touched=False; return
             self.trend='downtrend'; self.exchange_trend=True
-            self.lh=self.hh; self.ll=(len(self.kline_buffer)-1,'low',l)
+            self.lh=self.hh; self.ll=(self.kline_buffer.end-1,'low',l)
             self._try_order('sell')
 
         # ③ 无破坏 → 推进高低点
-        elif len(self.kline_buffer) >= 3:
-            self._advance_high_low()
-
-    # ---------- 推进高低点（原版方法） ----------
-    def _advance_high_low(self):
-        prev = self.kline_buffer[-2]
-        idx  = len(self.kline_buffer)-2
-        p3,p1 = self.kline_buffer[-3], self.kline_buffer[-1]
+        elif p3 is not None:
+            self._advance_high_low(p3, prev, k)
+
+    # ---------- 推进高低点（原版规则，候选只记滚动极值） ----------
+    def _advance_high_low(self, p3, prev, p1):
+        idx  = self.kline_buffer.end-2          # prev 的序号
         is_high = prev[2] > p3[2] and prev[2] > p1[2]
         is_low  = prev[3] < p3[3] and prev[3] < p1[3]
 
         if self.trend=='uptrend':
             if is_low:
-                self.hl_candidates.append((idx,'low',prev[3]))
+                if self._hl_i is None or prev[3] < self._hl_v:     # 并列保留最早
+                    self._hl_i, self._hl_v = idx, prev[3]
             elif is_high:
-                if self.hl_candidates:
-                    cand=min(self.hl_candidates,key=lambda x:x[2])
+                if self._hl_i is not None:
                     if prev[2] > (self.hh[2] if self.hh else -1e18):
-                        self.hl,self.hh = cand,(idx,'high',prev[2])
-                    self.hl_candidates.clear()
+                        self.hl,self.hh = (self._hl_i,'low',self._hl_v),(idx,'high',prev[2])
+                    self._hl_i = self._hl_v = None
                 elif self.hh is None or prev[2] > self.hh[2]:
                     self.hh = (idx,'high',prev[2])
         else:
             if is_high:
-                self.lh_candidates.append((idx,'high',prev[2]))
+                if self._lh_i is None or prev[2] > self._lh_v:
+                    self._lh_i, self._lh_v = idx, prev[2]
             elif is_low:
-                if self.lh_candidates:
-                    cand=max(self.lh_candidates,key=lambda x:x[2])
+                if self._lh_i is not None:
                     if prev[3] < (self.ll[2] if self.ll else 1e18):
-                        self.lh,self.ll = cand,(idx,'low',prev[3])
-                    self.lh_candidates.clear()
+                        self.lh,self.ll = (self._lh_i,'high',self._lh_v),(idx,'low',prev[3])
+                    self._lh_i = self._lh_v = None
                 elif self.ll is None or prev[3] < self.ll[2]:
                     self.ll = (idx,'low',prev[3])
 
     # ---------- 下单（与原版一致） ----------
     def _try_order(self, side):
-        if self.order_sent or not can_open_new_position(self.symbol):
+        if self.order_sent or not can_open_new_position(self.symbol, self.ctx):
             return
+        rr, risk = self.ctx.tp_ratio, self.ctx.risk_usd
         if side=='buy' and self.hl:
-            hl_idx = self.hl[0]
-            for i in range(hl_idx, -1, -1):
-                o,_,_,_,c = self.kline_buffer[i][1:6]
-                if c < o:            # 找到下跌实体
-                    entry = round_price(self.symbol, max(o,c))
-                    sl    = round_price(self.symbol, self.hl[2])
-                    tp    = round_price(self.symbol, entry + 2.5*(entry-sl))
-                    sz    = round(100/abs(entry-sl),4)
-                    register_position(self.symbol, entry, sl, tp, 'buy', sz)
-                    log_trade(self.symbol,'buy',entry)
-                    self.order_sent=True; break
+            k = self._body(self.bodies.bear, self.hl[0])   # HL 及之前最近的下跌实体
+            if k:
+                _,o,_,_,c = k
+                entry = round_price(self.symbol, max(o,c))
+                sl    = round_price(self.symbol, self.hl[2])
+                tp    = round_price(self.symbol, entry + rr*(entry-sl))
+                sz    = self._size(entry, sl, risk)
+                if not sz: return
+                register_position(self.symbol, entry, sl, tp, 'buy', sz, ctx=self.ctx)
+                log_trade(self.symbol,'buy',entry)
+                self.order_sent=True
         elif side=='sell' and self.hh:
-            hh_idx = self.hh[0]
-            for i in range(hh_idx, -1, -1):
-                o,_,_,_,c = self.kline_buffer[i][1:6]
-                if c > o:            # 上涨实体
-                    entry = round_price(self.symbol, min(o,c))
-                    sl    = round_price(self.symbol, self.hh[2])
-                    tp    = round_price(self.symbol, entry - 2.5*(sl-entry))
-                    sz    = round(100/abs(sl-entry),4)
-                    register_position(self.symbol, entry, sl, tp, 'sell', sz)
-                    log_trade(self.symbol,'sell',entry)
-                    self.order_sent=True; break
+            k = self._body(self.bodies.bull, self.hh[0])   # HH 及之前最近的上涨实体
+            if k:
+                _,o,_,_,c = k
+                entry = round_price(self.symbol, min(o,c))
+                sl    = round_price(self.symbol, self.hh[2])
+                tp    = round_price(self.symbol, entry - rr*(sl-entry))
+                sz    = self._size(entry, sl, risk)
+                if not sz: return
+                register_position(self.symbol, entry, sl, tp, 'sell', sz, ctx=self.ctx)
+                log_trade(self.symbol,'sell',entry)
+                self.order_sent=True
+
+    def _size(self, entry, sl, risk):
+        """
+        固定风险 → 张数：risk / (止损距离 × ctVal)，按 lotSz 向下取整；
+        止损距离为 0 或不足 minSz → 0（不下单）
+        """
+        dist = abs(entry - sl)
+        if dist == 0:
+            log_message(f"[下单] {self.symbol} 止损与入场同价 {entry}，跳过")
+            return 0.0
+        sz = round_size(self.symbol, risk/(dist*instrument(self.symbol)["ctVal"]))
+        if not sz:
+            log_message(f"[下单] {self.symbol} 张数不足 minSz，跳过")
+        return sz
+
+    def _body(self, last_body, seq):
+        """seq 及之前最近的反向实体 K 线；不存在或已被环形缓冲淘汰 → None"""
+        try:
+            i = last_body[seq]
+            return self.kline_buffer[i] if i >= 0 else None
+        except IndexError:
+            return None
 
     # ---------- 止盈 / 止损判定 ----------
-    def _check_exit(self, price, pos):
-        if pos['trend']=='buy':
-            if price<=pos['sl']: return True,-100
-            if price>=pos['tp']: return True,+250
-        else:
-            if price>=pos['sl']: return True,-100
-            if price<=pos['tp']: return True,+250
-        return False,0
+    def _check_exit(self, k, pos):
+        """本根影线触及 SL / TP → (True, 盈亏)；同根两者都触及 → 止损"""
+        j, hit = resolve_exit([k], pos)
+        return (True, exit_profit(hit, self.ctx.risk_usd, self.ctx.tp_ratio)) \
+               if hit else (False, 0)
 
 
 
@@ -1,14 +1,15 @@
 # okx_quant_strategy/strategy_4h.py
 
-from utils import find_highs_lows, build_trend
+from utils import (find_highs_lows, build_trend, TrendWalker, last_body_index, BodyIndex,
+                   _NAMES, _alternate_keep)
+from candles import as_ohlc, stack_ohlc
 from okx_api import fetch_kline
 from logger import logger
-from config import COOLDOWN_DURATION_HOURS
 #from risk_control import can_open_new_position, register_position
+from risk_control import is_in_cooldown as _is_in_cooldown, set_cooldown as _set_cooldown
 
-import time
-
-cooldown_tracker = {}
+import numpy as np
+from collections import deque
 
 def analyze_4h(candles,symbol):
     #candles = fetch_kline(symbol, "4H", 100)
@@ -19,14 +20,14 @@ def analyze_4h(candles,symbol):
     #print("trend_info",trend_info)
     if not trend:
         #logger.info(f"[4H] 无趋势识别: {symbol}")
-        return None, None
+        return None, None, None
 
     order_block = build_order_block(candles, trend_info, trend)
 
     if order_block:
         logger.info(f"[4H] 识别到趋势: {trend}, OB: {order_block}")
         return trend,trend_info, order_block
-    return None, None
+    return None, None, None
 
 # utils.py  ── 覆盖原函数即可
 def build_order_block(candles, trend_info, trend):
@@ -37,24 +38,187 @@ def build_order_block(candles, trend_info, trend):
       · downtrend: LH 所在 K 线如果本身是上涨实体(O<C)，就直接用它；
                    否则继续向前找第一根上涨实体。
     返回格式: {'top': price, 'bottom': price}
+    candles: CandleSeries 或 [[o,h,l,c], ...]
     """
+    opens, _, _, closes = as_ohlc(candles)
+    last_bear, last_bull = last_body_index(opens, closes)
     if trend == 'uptrend' and trend_info.get('hl'):
-        start = trend_info['hl'][0]           # 最新 HL 的索引
-        for i in range(start, -1, -1):        # ★ 从 HL 那根开始向前
-            o, h, l, c = candles[i]
-            if c < o:                         # 下跌实体
-                return {'top': o, 'bottom': c}
+        return _ob_at(opens, closes, last_bear[trend_info['hl'][0]])   # 最新 HL 处
     elif trend == 'downtrend' and trend_info.get('lh'):
-        start = trend_info['lh'][0]           # 最新 LH 的索引
-        for i in range(start, -1, -1):        # ★ 从 LH 那根开始向前
-            o, h, l, c = candles[i]
-            if c > o:                         # 上涨实体
-                return {'top': c, 'bottom': o}
+        return _ob_at(opens, closes, last_bull[trend_info['lh'][0]])   # 最新 LH 处
     return None
 
+def _ob_at(opens, closes, j):
+    """第 j 根实体 → {'top','bottom'}；j<0（之前没有反向实体）→ None"""
+    if j < 0:
+        return None
+    o, c = float(opens[j]), float(closes[j])
+    return {'top': max(o, c), 'bottom': min(o, c)}
+
+# ═══════════════════════════════════════
+# 全币种批量分析
+# ═══════════════════════════════════════
+def analyze_4h_batch(symbols, candles_list=None, o=None, h=None, l=None, c=None,
+                     pad=None):
+    """
+    全币种 4H 分析一次完成：symbol -> (trend, trend_info, ob)，
+    每个币种的结果与 analyze_4h(该币种 K 线) 相同（下标以该币种首根为 0）
+    输入二选一：
+      · candles_list : 与 symbols 对应的 K 线（CandleSeries / 列表），内部 stack_ohlc
+      · o/h/l/c, pad : 已堆好的 (币种 × K 线) 矩阵，左侧 NaN 填充，pad 为各行填充根数
+    分形、高低点交替合并、反向实体下标都是整矩阵数组运算；
+    只有 TrendWalker 的趋势推进按币种逐点进行（每币种几十个点）
+    """
+    if candles_list is not None:
+        o, h, l, c, pad = stack_ohlc(candles_list)
+    S = len(symbols)
+    if pad is None:                                  # 整行 NaN（无 K 线）→ 整行都是填充
+        nan = np.isnan(c)
+        pad = np.where(nan.all(axis=1), c.shape[1], nan.argmin(axis=1))
+
+    # ① 分形（NaN 比较为 False，填充位不会成为分形）
+    hm, lm  = h[:, 1:-1], l[:, 1:-1]
+    is_high = (hm > h[:, :-2]) & (hm > h[:, 2:])
+    is_low  = (lm < l[:, :-2]) & (lm < l[:, 2:])
+    row, col = np.nonzero(is_high | is_low)          # 行优先：按币种、时间有序
+    kind = is_high[row, col].astype(np.int64) - is_low[row, col]
+    col += 1
+
+    # ② 交替合并（各币种分段）
+    keep, typ, val = _alternate_keep(kind, h[row, col], l[row, col], row)
+    row, col = row[keep], col[keep]
+
+    # ③ OB 候选：每根 K 线处最近的阴 / 阳实体下标（整矩阵一次 accumulate）
+    last_bear, last_bull = last_body_index(o, c)
+    names = _NAMES[typ + 1].tolist()
+    rel   = (col - pad[row]).tolist()
+    vals  = val.tolist()
+    bounds = np.searchsorted(row, np.arange(S + 1)).tolist()
+
+    # ④ 逐币种趋势推进
+    out, hits = {}, 0
+    for s, sym in enumerate(symbols):
+        a, b = bounds[s], bounds[s+1]
+        trend, info = build_trend(list(zip(rel[a:b], names[a:b], vals[a:b])))
+        ob = None
+        if trend == 'uptrend' and info.get('hl'):
+            ob = _ob_at(o[s], c[s], last_bear[s, info['hl'][0] + pad[s]])
+        elif trend == 'downtrend' and info.get('lh'):
+            ob = _ob_at(o[s], c[s], last_bull[s, info['lh'][0] + pad[s]])
+        if ob:
+            out[sym] = (trend, info, ob); hits += 1
+        else:
+            out[sym] = (None, None, None)
+    logger.info(f"[4H] 批量分析 {S} 个币种，{hits} 个识别到趋势与 OB")
+    return out
+
+# ═══════════════════════════════════════
+# 增量结构引擎
+# ═══════════════════════════════════════
+class Structure4H:
+    """
+    4H 结构增量引擎：逐根 push 已收盘 4H，analyze() 的结果与
+    analyze_4h(迄今全部 K 线) 相同，但每根摊还 O(1)，不再反复全量重算
+    · 分形：新 K 线到来即可确认前一根是否为高 / 低点，原始分形记入 _fr
+    · 交替合并：只有最后一个点可能被更极端的同类点替换（暂定点），
+      之前的点都已定型，按顺序喂给 TrendWalker
+    · 查询：在 walker 副本上套用暂定点；OB 由 BodyIndex 一次查表
+    · window=N：只看最近 N 根（与 analyze_4h(最近 N 根) 相同）；K 线、实体下标
+      定长滚动，滑出窗口的分形直接丢弃，push 仍是 O(1)。趋势状态取决于窗口起点，
+      窗口滑动后由下一次 analyze() 用窗口内剩余分形重走一遍（几十个点，不碰 K 线）；
+      只喂不查（轮询批量分析）时不做这一步
+    """
+    def __init__(self, candles=None, window:int=None):
+        self.window  = window
+        self.o, self.h, self.l, self.c = (deque(maxlen=window) for _ in range(4))
+        self.bodies  = BodyIndex(capacity=window)     # 下标为绝对序号
+        self._fr     = deque()           # 窗口内原始分形 (绝对序号, 是高点, 是低点)
+        self._n      = 0                 # 已喂入根数
+        self._walk()
+        if candles is not None:
+            self.extend(candles)
+
+    @property
+    def _base(self):
+        """窗口首根的绝对序号"""
+        return self._n - len(self.c)
+
+    def _walk(self):
+        """从窗口起点重走合并 / 趋势状态"""
+        self.walker  = TrendWalker()
+        self.last    = None              # 暂定末点
+        self._walked = self._base        # 当前状态对应的窗口起点
+        self._result = None
+        for f in self._fr:
+            self._point(*f)
+
+    def __len__(self):
+        return len(self.c)
+
+    def push(self, candle):
+        """candle: [o,h,l,c]"""
+        o, h, l, c = map(float, candle)
+        self.o.append(o); self.h.append(h); self.l.append(l); self.c.append(c)
+        self.bodies.push(o, c)
+        self._n += 1
+        self._result = None
+        base = self._base
+        while self._fr and self._fr[0][0] <= base:    # 左邻已滑出窗口
+            self._fr.popleft()
+        if len(self.c) < 3:
+            return
+        is_high = self.h[-2] > self.h[-3] and self.h[-2] > h    # 新 K 线确认前一根是否为分形
+        is_low  = self.l[-2] < self.l[-3] and self.l[-2] < l
+        if is_high or is_low:
+            self._fr.append((self._n - 2, is_high, is_low))
+            if self._walked == base:                 # 窗口未滑动：增量合并
+                self._point(*self._fr[-1])
+
+    def extend(self, candles):
+        for k in zip(*as_ohlc(candles)):
+            self.push(k)
+
+    def _point(self, i, is_high, is_low):
+        j = i - self._base
+        if is_high and is_low:                       # 同时是高低点：取与前一点相反
+            self._fold(j, 'low' if self.last and self.last[1] == 'high' else 'high', True)
+        else:
+            self._fold(j, 'high' if is_high else 'low')
+
+    def _fold(self, j, kind, both=False):
+        p = (j, kind, self.h[j] if kind == 'high' else self.l[j])
+        last = self.last
+        if last and last[1] == kind and not both:    # 同类：只留更极端者
+            if (kind == 'high' and p[2] > last[2]) or (kind == 'low' and p[2] < last[2]):
+                self.last = p
+            return
+        if last:
+            self.walker.push(last)                   # 前一点定型
+        self.last = p
+
+    def analyze(self):
+        """→ (trend, trend_info, ob)；无趋势或无 OB → (None, None, None)"""
+        if self._walked != self._base:
+            self._walk()
+        if self._result is None:
+            trend, info = self.walker.result(self.last)
+            ob = self.order_block(trend, info) if trend else None
+            self._result = (trend, info, ob) if ob else (None, None, None)
+        return self._result
+
+    def order_block(self, trend, trend_info):
+        base = self._base                            # 窗口之前的实体不算 → _ob_at 得 None
+        if trend == 'uptrend' and trend_info.get('hl'):
+            return _ob_at(self.o, self.c, self.bodies.bear[trend_info['hl'][0] + base] - base)
+        elif trend == 'downtrend' and trend_info.get('lh'):
+            return _ob_at(self.o, self.c, self.bodies.bull[trend_info['lh'][0] + base] - base)
+        return None
+
 
-def is_in_cooldown(symbol):
-    return cooldown_tracker.get(symbol, 0) > time.time()
+def is_in_cooldown(symbol, ctx=None):
+    """与 15m 共用 ctx 的冷却表，按 ctx.now_ms() 判断（回测为 K 线时间）"""
+    return _is_in_cooldown(symbol, ctx)
 
-def set_cooldown(symbol):
-    cooldown_tracker[symbol] = time.time() + 3600 * COOLDOWN_DURATION_HOURS
+def set_cooldown(symbol, ctx=None):
+    """冷却 ctx.cooldown_hours 小时，起点 ctx.now_ms()"""
+    _set_cooldown(symbol, ctx=ctx)
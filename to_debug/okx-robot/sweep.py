@@ -0,0 +1,185 @@
+# okx_quant_strategy/sweep.py
+# ──────────────────────────────────────────
+"""
+参数扫描：tp_ratio × risk_usd × cooldown_hours 网格，多进程并行回测
+· K 线只在父进程载入一次，装进 multiprocessing.shared_memory（SharedCandles）
+· 子进程按块名挂载，逐币种取 CandleSeries 视图（零拷贝），任务只传参数 dict
+· 每组参数一个 StrategyContext，冷却按 K 线时间推进；
+  每组写一张逐币种结果表 <out>/<tag>.csv，汇总写 <out>/summary.csv
+  （<out> 默认 config.SWEEP_RESULTS_DIR，即本目录 data/sweeps，已在 .gitignore 内）
+· 子进程只读共享内存里的 4H / 15m，不碰连续仓库；同根双触的 1m 下钻走
+  fetch_1m 的稀疏窗口缓存（一窗一文件、原子替换），多进程同时下钻同一币种也安全
+用法：
+  python sweep.py --tp 2 2.5 3 --risk 100 --cooldown 12 24 --top 50
+"""
+# ──────────────────────────────────────────
+import os, time, logging, argparse, itertools
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config       import (TP_RATIO, FIXED_RISK_USD, COOLDOWN_DURATION_HOURS,
+                          SWEEP_RESULTS_DIR)
+from okx_api      import fetch_usdt_contracts, fetch_4h_with_ts, fetch_15m
+from candles      import CandleSeries
+from risk_control import StrategyContext
+from backtest_4h  import backtest_symbol
+from logger       import logger
+import rate_limiter, okx_api
+
+BAR4_MS = 4*3600*1000
+
+
+class SharedCandles:
+    """
+    多币种 K 线放进两块共享内存：ts（int64）与 o/h/l/c（float64，4 行）
+    · create(series)   父进程：{key: CandleSeries} 拷贝一次
+    · attach(spec)     子进程：按 spec 挂载，get(key) 返回视图，不拷贝
+    · spec = (ts 块名, ohlc 块名, 总根数, {key: (a, b)})，很小，可随进程参数 pickle
+    """
+    def __init__(self, shm_ts, shm_px, n, index):
+        self.shm_ts, self.shm_px, self.n, self.index = shm_ts, shm_px, n, index
+        self.ts = np.ndarray((n,),   dtype=np.int64,   buffer=shm_ts.buf)
+        self.px = np.ndarray((4, n), dtype=np.float64, buffer=shm_px.buf)
+
+    @classmethod
+    def create(cls, series:dict):
+        index, n = {}, 0
+        for key, s in series.items():
+            index[key] = (n, n + len(s)); n += len(s)
+        shm_ts = shared_memory.SharedMemory(create=True, size=max(8, n*8))
+        shm_px = shared_memory.SharedMemory(create=True, size=max(8, n*32))
+        out = cls(shm_ts, shm_px, n, index)
+        for key, s in series.items():
+            a, b = index[key]
+            out.ts[a:b] = s.ts
+            for k, col in enumerate((s.o, s.h, s.l, s.c)):
+                out.px[k, a:b] = col
+        return out
+
+    @classmethod
+    def attach(cls, spec):
+        ts_name, px_name, n, index = spec
+        return cls(shared_memory.SharedMemory(name=ts_name),
+                   shared_memory.SharedMemory(name=px_name), n, index)
+
+    @property
+    def spec(self):
+        return self.shm_ts.name, self.shm_px.name, self.n, self.index
+
+    def get(self, key):
+        a, b = self.index[key]
+        return CandleSeries(self.ts[a:b], *(self.px[k, a:b] for k in range(4)))
+
+    def close(self):
+        self.ts = self.px = None                 # 先放掉视图，才能关闭映射
+        self.shm_ts.close(); self.shm_px.close()
+
+    def unlink(self):
+        self.shm_ts.unlink(); self.shm_px.unlink()
+
+# ═══════════════════════════════════════
+# 父进程：载入
+# ═══════════════════════════════════════
+def load_candles(symbols, bars:int=300):
+    """每个币种最近 bars 根 4H 及其覆盖区间的 15m → {(sym,'4H'|'15m'): CandleSeries}"""
+    out = {}
+    for sym in symbols:
+        kl4 = fetch_4h_with_ts(sym, bars, as_series=True)
+        if len(kl4) < 120:
+            continue
+        out[(sym, '4H')]  = kl4
+        out[(sym, '15m')] = fetch_15m(sym, int(kl4.ts[0]), int(kl4.ts[-1])+BAR4_MS-1,
+                                      as_series=True)
+    return out
+
+# ═══════════════════════════════════════
+# 子进程：一组参数跑全部币种
+# ═══════════════════════════════════════
+_shared = None
+
+def _init_worker(spec, workers:int):
+    global _shared
+    _shared = SharedCandles.attach(spec)
+    okx_api.reset_after_fork()               # load_candles 之后 fork：继承的线程池 / 连接不可用
+    rate_limiter.set_share(1/workers)        # 1m 下钻缺数据时仍可能走 REST
+    logger.setLevel(logging.WARNING)         # 逐根 4H 的 info 日志在扫描里只是噪声
+
+def _run_combo(params:dict):
+    """→ (params, [逐币种结果 dict])；各币种各用一个新 ctx"""
+    rows = []
+    for sym in sorted({k[0] for k in _shared.index}):
+        r = backtest_symbol(sym, ctx=StrategyContext(**params),
+                            kl4=_shared.get((sym, '4H')), kl15=_shared.get((sym, '15m')))
+        if r: rows.append(r)
+    return params, rows
+
+def _tag(p:dict):
+    return f"tp{p['tp_ratio']}_risk{p['risk_usd']}_cd{p['cooldown_hours']}"
+
+def _summary(params:dict, rows:list):
+    df = pd.DataFrame(rows)
+    trades = int(df['trades'].sum()) if rows else 0
+    wins   = int(df['wins'].sum())   if rows else 0
+    return {**params, 'symbols': len(rows), 'trades': trades, 'wins': wins,
+            'losses': trades - wins, 'pnl': float(df['pnl'].sum()) if rows else 0.0,
+            'win_rate': wins/trades*100 if trades else 0.0}
+
+def run_sweep(symbols, grid:dict, out_dir:str=SWEEP_RESULTS_DIR, workers:int=None):
+    """
+    grid: {'tp_ratio': [...], 'risk_usd': [...], 'cooldown_hours': [...]}
+    → 汇总 DataFrame（每组参数一行，按 pnl 降序），同时写 CSV
+    """
+    keys   = list(grid)
+    combos = [dict(zip(keys, v)) for v in itertools.product(*grid.values())]
+    os.makedirs(out_dir, exist_ok=True)
+
+    t0 = time.time()
+    shared = SharedCandles.create(load_candles(symbols))
+    print(f"[扫描] 载入 {len(shared.index)//2} 个币种 {shared.n} 根 K 线 "
+          f"({(shared.n*40)/2**20:.1f} MB 共享内存, {time.time()-t0:.0f}s)，"
+          f"{len(combos)} 组参数", flush=True)
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(combos)))
+    summary = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared.spec, workers)) as ex:
+            futs = [ex.submit(_run_combo, p) for p in combos]
+            for n, f in enumerate(as_completed(futs), 1):
+                params, rows = f.result()
+                pd.DataFrame(rows).to_csv(os.path.join(out_dir, f"{_tag(params)}.csv"),
+                                          index=False)
+                s = _summary(params, rows); summary.append(s)
+                print(f"[{n}/{len(combos)}] {_tag(params):<28} {s['trades']} 笔 "
+                      f"pnl={s['pnl']:.0f} 胜率={s['win_rate']:.1f}%  "
+                      f"({time.time()-t0:.0f}s)", flush=True)
+    finally:
+        shared.close(); shared.unlink()
+
+    df = pd.DataFrame(summary).sort_values('pnl', ascending=False, ignore_index=True)
+    df.to_csv(os.path.join(out_dir, "summary.csv"), index=False)
+    return df
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="4H OB + 15m 结构 参数扫描")
+    p.add_argument("symbols", nargs="*", help="指定币种；缺省为全部 USDT-SWAP")
+    p.add_argument("--top", type=int, default=None, help="只取前 N 个币种")
+    p.add_argument("--tp", type=float, nargs="+", default=[TP_RATIO], help="盈亏比")
+    p.add_argument("--risk", type=float, nargs="+", default=[FIXED_RISK_USD],
+                   help="每笔固定止损金额 USDT")
+    p.add_argument("--cooldown", type=float, nargs="+", default=[COOLDOWN_DURATION_HOURS],
+                   help="刺穿 OB 后冷却小时数")
+    p.add_argument("--workers", type=int, default=None, help="进程数（默认 CPU 核数）")
+    p.add_argument("--out", default=SWEEP_RESULTS_DIR, help="结果目录（默认 data/sweeps）")
+    return p.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    syms = args.symbols or fetch_usdt_contracts()
+    if args.top: syms = syms[:args.top]
+    df = run_sweep(syms, {'tp_ratio': args.tp, 'risk_usd': args.risk,
+                          'cooldown_hours': args.cooldown},
+                   args.out, args.workers)
+    print(df.to_string())
@@ -0,0 +1,88 @@
+# okx_quant_strategy/test_backtest_4h.py
+# ──────────────────────────────────────────
+"""backtest_4h：每笔持仓只记一次、组合回测的时钟与仓位上限"""
+# ──────────────────────────────────────────
+from collections import Counter
+import pytest
+
+import backtest_4h as bt
+import strategy_15m
+from candles      import CandleSeries
+from risk_control import StrategyContext
+from conftest     import SYMBOLS, M15
+
+
+@pytest.fixture
+def market(monkeypatch, synth):
+    """data[sym] = (4H, 15m)；回测只读 data；1m 下钻给平盘（同根双触按止损）"""
+    data = {}
+    monkeypatch.setattr(bt, "fetch_4h_with_ts",
+                        lambda sym, n, end_ts=None, as_series=False: data[sym][0])
+    monkeypatch.setattr(bt, "fetch_15m",
+                        lambda sym, st, et, as_series=False: data[sym][1].between(st, et))
+    monkeypatch.setattr(bt, "fetch_1m", lambda sym, st, et, as_series=False:
+                        CandleSeries.from_rows([[st + m*60_000, 100, 100, 100, 100]
+                                                for m in range(15)]))
+    # booked: 每次开仓 (币种, 开仓那根 15m 的 ts, 当时的回测时钟)
+    booked, bar, update, register = [], {}, bt.Trend15State.update, strategy_15m.register_position
+    def spy_update(self, k):
+        bar[self.symbol] = k[0]
+        return update(self, k)
+    def spy_register(symbol, *a, ctx=None, **k):
+        booked.append((symbol, bar[symbol], ctx.clock_ms))
+        return register(symbol, *a, ctx=ctx, **k)
+    monkeypatch.setattr(bt.Trend15State, "update", spy_update)
+    monkeypatch.setattr(strategy_15m, "register_position", spy_register)
+    return data, synth, booked
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_each_entry_booked_once(market, seed):
+    data, synth, booked = market
+    sym = SYMBOLS[0]
+    data[sym] = synth(seed)
+    r = bt.backtest_symbol(sym, ctx=StrategyContext())
+    dup = [k for k, n in Counter((s, ts) for s, ts, _ in booked).items() if n > 1]
+    assert not dup
+    assert all(ts == clock for _, ts, clock in booked)     # 不在时钟之前的 K 线上开仓
+    assert (r['trades'] if r else 0) <= len(booked)
+
+
+def test_portfolio_cap_only_blocked_by_live_positions(market, monkeypatch):
+    """
+    仓位上限 1：另一币种被拒时，占着仓位的持仓必须已在时钟之前真实开仓、
+    且出场根尚未收盘（回溯 K 线上补开的持仓不能挤掉别的币种）
+    """
+    data, synth, booked = market
+    for k, sym in enumerate(SYMBOLS):
+        data[sym] = synth(k + 3)                # 这组行情在上限 1 时会发生拒单
+    entry, blocked = {}, []
+    register, can_open = strategy_15m.register_position, strategy_15m.can_open_new_position
+    def spy_register(symbol, *a, ctx=None, **k):
+        register(symbol, *a, ctx=ctx, **k)
+        entry[id(ctx.active_positions[symbol])] = booked[-1][1]
+    def spy_can_open(symbol, ctx=None):
+        ok = can_open(symbol, ctx)
+        if not ok and len(ctx.active_positions) >= ctx.max_positions:
+            for s, pos in ctx.active_positions.items():
+                exit_ts = ctx.pending_exits.get(s, (None,))[0]
+                blocked.append(entry[id(pos)] <= ctx.clock_ms and
+                               (exit_ts is None or exit_ts + M15 > ctx.clock_ms))
+        return ok
+    monkeypatch.setattr(strategy_15m, "register_position",
+                        lambda *a, **k: spy_register(*a, **k))
+    monkeypatch.setattr(strategy_15m, "can_open_new_position", spy_can_open)
+
+    res, ctx = bt.backtest_portfolio(SYMBOLS, max_positions=1)
+    assert blocked and all(blocked)
+    assert all(ts == clock for _, ts, clock in booked)
+    assert not ctx.active_positions and not ctx.pending_exits
+
+
+def test_portfolio_without_cap_equals_single_runs(market):
+    data, synth, booked = market
+    for k, sym in enumerate(SYMBOLS):
+        data[sym] = synth(k)
+    single = [r for s in SYMBOLS for r in [bt.backtest_symbol(s, ctx=StrategyContext())] if r]
+    res, _ = bt.backtest_portfolio(SYMBOLS, max_positions=10**6)
+    assert res == single
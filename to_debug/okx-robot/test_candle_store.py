@@ -0,0 +1,58 @@
+# okx_quant_strategy/test_candle_store.py
+# ──────────────────────────────────────────
+"""candle_store / okx_api._load_candles：只补覆盖区间外的缺口；未稳定的尾部不记入覆盖区间"""
+# ──────────────────────────────────────────
+import time
+import numpy as np
+
+import okx_api
+from conftest import SYMBOLS, M15
+
+SYM = SYMBOLS[0]
+
+
+def _last_closed():
+    return int(time.time()*1000)//M15*M15 - M15
+
+
+def _requested(calls):
+    """history-candles 请求覆盖的 after 值（每页一个）"""
+    return [p["after"] for name, p in calls if name == "history-candles"]
+
+
+def test_gap_fill_only_requests_head_and_tail(okx_calls):
+    end = _last_closed() - 50*M15
+    mid = okx_api.fetch_15m(SYM, end - 499*M15, end - 200*M15, as_series=True)
+    assert len(mid) == 300 and okx_api._store.coverage(SYM, "15m") == (mid.ts[0], mid.ts[-1])
+    okx_calls.clear()
+
+    full = okx_api.fetch_15m(SYM, end - 999*M15, end, as_series=True)
+    assert len(full) == 1000 and np.all(np.diff(full.ts) == M15)
+    after = _requested(okx_calls)
+    assert after and not any(mid.ts[0] < a <= mid.ts[-1] + 1 for a in after)  # 已覆盖段不再拉
+    assert len(after) == 5 + 2                     # 头 500 根 5 页，尾 200 根 2 页
+    np.testing.assert_array_equal(full.between(mid.ts[0], mid.ts[-1]).c, mid.c)
+
+    okx_calls.clear()
+    again = okx_api.fetch_15m(SYM, end - 999*M15, end, as_series=True)
+    assert not okx_calls and np.array_equal(again.c, full.c)
+
+
+def test_unconfirmed_tail_is_not_marked_covered(offline, monkeypatch):
+    """交易所晚确认最近一根：这次拿不到，覆盖区间停在实际拿到的最后一根，下次补上"""
+    lag = {"on": True}
+    def lagging(url, params, tag, **kw):
+        js = offline(url, params, tag, **kw)
+        if lag["on"] and "history" in url:
+            js["data"] = [r for r in js["data"] if int(r[0]) < _last_closed()]
+        return js
+    monkeypatch.setattr(okx_api, "_safe_get", lagging)
+
+    end = _last_closed()
+    kl = okx_api.fetch_15m(SYM, end - 99*M15, end, as_series=True)
+    assert kl.ts[-1] == end - M15
+    assert okx_api._store.coverage(SYM, "15m")[1] == end - M15
+
+    lag["on"] = False
+    kl = okx_api.fetch_15m(SYM, end - 99*M15, end, as_series=True)
+    assert kl.ts[-1] == end and len(kl) == 100 and np.all(np.diff(kl.ts) == M15)
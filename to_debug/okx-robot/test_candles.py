@@ -0,0 +1,54 @@
+# okx_quant_strategy/test_candles.py
+# ──────────────────────────────────────────
+"""candles：CandleRing 列视图与行一致；Trend15State 找结构点走列视图"""
+# ──────────────────────────────────────────
+import timeit
+import numpy as np
+
+import strategy_15m
+from candles     import CandleRing, CandleSeries
+from config      import TREND15_BUFFER_SIZE
+from strategy_15m import Trend15State
+from utils       import find_highs_lows_15m
+
+
+def _state(synth, seed=0):
+    _, kl15 = synth(seed, n4=TREND15_BUFFER_SIZE // 16 + 20)
+    l0 = float(kl15.l[-TREND15_BUFFER_SIZE])
+    ob = {"bottom": l0 - 1e-9, "top": l0 + 1e-9}            # 缓冲首根即触碰 → 整个缓冲都要找点
+    return Trend15State("X-USDT-SWAP", ob, "uptrend", int(kl15.ts[0]), kl15), kl15
+
+
+def test_ring_series_matches_rows_across_wrap(synth):
+    _, kl15 = synth(1, n4=20)
+    ring = CandleRing(100, kl15[:37])
+    for k in kl15[37:]:
+        ring.append(list(k))
+        for seq in (0, ring.start, ring.end - 50, ring.end - 1, ring.end):
+            s = ring.series(seq)
+            assert isinstance(s, CandleSeries)
+            assert [list(r) for r in s] == [list(r) for r in ring.since(seq)]
+    assert np.shares_memory(ring.series(ring.start).h, ring._px)             # 视图，不拷贝
+
+
+def test_trend15_structure_uses_column_view(synth, monkeypatch):
+    seen = []
+    real = strategy_15m.find_highs_lows_15m
+    monkeypatch.setattr(strategy_15m, "find_highs_lows_15m",
+                        lambda c, *a: seen.append(c) or real(c, *a))
+    st, _ = _state(synth)
+    assert st.ob_touched and len(seen) == 1
+    assert isinstance(seen[0], CandleSeries) and len(seen[0]) == TREND15_BUFFER_SIZE
+
+
+def test_trend15_column_view_faster_than_rows(synth):
+    """真实调用方的输入（满缓冲）：列视图结果相同，且不再付 list → ndarray 的转换"""
+    st, _ = _state(synth)
+    buf, a = st.kline_buffer, st.kline_buffer.start
+    assert st.ob_touched and len(buf) == TREND15_BUFFER_SIZE
+    assert find_highs_lows_15m(buf.series(a), "uptrend", a) == \
+           find_highs_lows_15m(buf.since(a),  "uptrend", a)
+    best = lambda f: min(timeit.repeat(f, number=10, repeat=5))
+    cols = best(lambda: find_highs_lows_15m(buf.series(a), "uptrend", a))
+    rows = best(lambda: find_highs_lows_15m(buf.since(a),  "uptrend", a))
+    assert cols * 2 < rows
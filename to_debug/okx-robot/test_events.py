@@ -0,0 +1,47 @@
+# okx_quant_strategy/test_events.py
+# ──────────────────────────────────────────
+"""events：掩码 + argmax 定位的首次触碰 / 刺穿与逐根比较一致"""
+# ──────────────────────────────────────────
+import random
+import pytest
+
+from events import first_true, first_touch, first_penetration
+
+
+def _loop_touch(rows, tr, ob, start):
+    for i in range(start, len(rows)):
+        x = rows[i][3] if tr == 'uptrend' else rows[i][2]
+        if ob['bottom'] <= x <= ob['top']:
+            return i
+    return None
+
+
+def _loop_penetration(rows, tr, ob, start):
+    for i in range(start, len(rows)):
+        if (tr == 'uptrend' and rows[i][3] < ob['bottom']) or \
+           (tr == 'downtrend' and rows[i][2] > ob['top']):
+            return i
+    return None
+
+
+def test_first_true_edges():
+    assert first_true([]) is None
+    assert first_true([False, False]) is None
+    assert first_true([True, False, True], 1) == 2
+    assert first_true([True], 1) is None
+
+
+@pytest.mark.parametrize("tr", ["uptrend", "downtrend"])
+@pytest.mark.parametrize("seed", range(3))
+def test_masks_match_per_bar_loop(synth, seed, tr):
+    _, kl15 = synth(seed, n4=40)
+    rows, rr = kl15.rows(), random.Random(seed)
+    for _ in range(60):
+        k = rr.randrange(len(rows))
+        v = rows[k][3] if tr == 'uptrend' else rows[k][2]
+        ob = {"bottom": v - rr.random()*2, "top": v + rr.random()*2}
+        start = rr.choice([0, rr.randrange(len(rows)), len(rows)])
+        for kl in (kl15, rows):                                  # CandleSeries / 旧列表输入
+            assert first_touch(kl, tr, ob, start) == _loop_touch(rows, tr, ob, start)
+            assert first_penetration(kl, tr, ob, start) == \
+                   _loop_penetration(rows, tr, ob, start)
@@ -0,0 +1,70 @@
+# okx_quant_strategy/test_instruments.py
+# ──────────────────────────────────────────
+"""instruments：warm 之后 get 只读内存，过期 / 未知合约在后台刷新、不阻塞调用方"""
+# ──────────────────────────────────────────
+import threading
+import pytest
+
+import instruments
+from instruments import InstrumentRegistry
+
+
+class _Fetch:
+    """假 /public/instruments：gate 未放行前阻塞，模拟慢网络"""
+    def __init__(self, *syms):
+        self.syms, self.calls = list(syms), 0
+        self.gate = threading.Event(); self.gate.set()
+
+    def __call__(self):
+        self.calls += 1
+        assert self.gate.wait(5)
+        return [{"instId": s, "tickSz": "0.1", "lotSz": "1", "ctVal": "0.01",
+                 "minSz": "1"} for s in self.syms]
+
+
+@pytest.fixture
+def reg(tmp_path):
+    fetch = _Fetch("A-USDT-SWAP")
+    r = InstrumentRegistry(fetch, path=str(tmp_path / "inst.json"))
+    r.warm()
+    assert fetch.calls == 1
+    return r, fetch
+
+
+def _join(r):
+    if r._bg is not None:
+        r._bg.join(5)
+
+
+def test_stale_table_served_while_refreshing(reg):
+    r, fetch = reg
+    fetch.gate.clear()
+    r.stamp = 0                                                # 已过期
+    r._last_try -= instruments.MISS_REFRESH_S
+    assert r.get("A-USDT-SWAP")["tickSz"] == 0.1              # 不等网络
+    bg = r._bg; assert bg.is_alive()
+    r.get("A-USDT-SWAP")                                       # 刷新中不重复发起
+    assert r._bg is bg
+    fetch.gate.set(); _join(r)
+    assert fetch.calls == 2 and not r._stale()
+
+
+def test_unknown_symbol_raises_now_and_appears_after_refresh(reg):
+    r, fetch = reg
+    fetch.gate.clear(); fetch.syms.append("B-USDT-SWAP")
+    r._last_try -= instruments.MISS_REFRESH_S
+    with pytest.raises(KeyError):
+        r.get("B-USDT-SWAP")
+    fetch.gate.set(); _join(r)
+    assert r.get("B-USDT-SWAP")["ctVal"] == 0.01
+    with pytest.raises(KeyError):                             # 一分钟内不再为未知合约刷新
+        r.get("C-USDT-SWAP")
+    assert fetch.calls == 2
+
+
+def test_restart_reads_disk_without_request(reg):
+    r, _ = reg
+    fetch = _Fetch()
+    r2 = InstrumentRegistry(fetch, path=r.path)
+    r2.warm()
+    assert fetch.calls == 0 and r2.get("A-USDT-SWAP") == r.get("A-USDT-SWAP")
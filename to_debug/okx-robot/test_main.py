@@ -0,0 +1,45 @@
+# okx_quant_strategy/test_main.py
+# ──────────────────────────────────────────
+"""main.SymbolTracker：穿透 OB 的冷却走 ctx（时长 ctx.cooldown_hours、起点 ctx.now_ms()）"""
+# ──────────────────────────────────────────
+import strategy_4h
+from candle_feed  import CandleEvent
+from candle_store import BAR_MS
+from main         import SymbolTracker
+from risk_control import StrategyContext
+
+SYM = "X-USDT-SWAP"
+M15 = BAR_MS["15m"]
+T0  = 1_700_006_400_000
+OB  = {"bottom": 100.0, "top": 101.0}
+
+
+def _ev(i, o, h, l, c, bar="15m"):
+    return CandleEvent(SYM, bar, [T0 + i*M15, o, h, l, c])
+
+
+def test_penetration_cooldown_follows_ctx_clock_and_hours(monkeypatch):
+    ctx = StrategyContext(cooldown_hours=2)
+    tr  = SymbolTracker(SYM, ctx)
+    tr.seed([], [], [[T0 - M15, 103, 104, 102, 103]])
+    tr.four_info = ("uptrend", {}, OB)
+    analyzed = []
+    monkeypatch.setattr(tr, "_on_4h", lambda *a: analyzed.append(ctx.now_ms()))
+
+    tr.on_candle(_ev(0, 102, 102.5, 100.5, 102))          # 触碰 → 建 15m 状态机
+    assert tr.t15_state is not None
+    tr.on_candle(_ev(1, 102, 102.5, 99, 100.5))            # 刺穿 → 冷却
+    pierced = T0 + 2*M15                                   # 该根收盘（事件时间）
+    assert tr.t15_state is None
+    assert ctx.cooldown_until_ms[SYM] == pierced + 2*3600_000
+    assert strategy_4h.is_in_cooldown(SYM, ctx)
+
+    for i in range(2, 9):                                  # 冷却内：触碰不建状态机、4H 不分析
+        tr.on_candle(_ev(i, 102, 102.5, 100.5, 102))
+        assert tr.t15_state is None
+    tr.on_candle(CandleEvent(SYM, "4H", [T0 + 6*M15 - BAR_MS["4H"], 102, 103, 99, 102]))
+    assert not analyzed
+
+    tr.on_candle(_ev(9, 102, 102.5, 100.5, 102))           # 收盘 = 刺穿后整 2h
+    assert not strategy_4h.is_in_cooldown(SYM, ctx)
+    assert tr.t15_state is not None
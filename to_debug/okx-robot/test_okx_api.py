@@ -0,0 +1,60 @@
+# okx_quant_strategy/test_okx_api.py
+# ──────────────────────────────────────────
+"""okx_api：分窗并发翻页的请求次数；fork 出的回测子进程重建线程池 / 连接"""
+# ──────────────────────────────────────────
+import time, multiprocessing
+import numpy as np
+
+import okx_api, http_session, backtest_4h
+from conftest import SYMBOLS, M15, M4
+
+SYM = SYMBOLS[0]
+
+
+def _history_calls(calls):
+    return sum(1 for name, _ in calls if name == "history-candles")
+
+
+def _past_end(bar_ms, back:int=10):
+    """离当前 back 根之前的已收盘 K 线开盘时间（远离未稳定的尾部）"""
+    return int(time.time()*1000)//bar_ms*bar_ms - back*bar_ms
+
+
+def test_pager_one_request_per_aligned_window(okx_calls):
+    end = _past_end(M15)
+    kl  = okx_api.fetch_15m(SYM, end - 999*M15, end, as_series=True)   # 1000 根 = 10 窗
+    assert len(kl) == 1000 and np.all(np.diff(kl.ts) == M15)
+    assert _history_calls(okx_calls) == 10
+
+
+def test_pager_unaligned_bounds_cost_no_extra_request(okx_calls):
+    end = _past_end(M15)
+    kl  = okx_api.fetch_15m(SYM, end - 999*M15 + 1, end + M15 - 1, as_series=True)
+    assert len(kl) == 999 and kl.ts[0] == end - 998*M15 and kl.ts[-1] == end
+    assert _history_calls(okx_calls) == 10
+
+
+def test_fetch_4h_300_bars_is_three_requests(okx_calls):
+    kl = okx_api.fetch_4h_with_ts(SYM, 300, end_ts=_past_end(M4), as_series=True)
+    assert len(kl) == 300
+    assert _history_calls(okx_calls) == 3
+
+
+def test_forked_worker_pages_with_fresh_pool_and_session(okx_calls):
+    end = _past_end(M15)
+    okx_api.fetch_15m(SYM, end - 999*M15, end)          # 父进程线程池已有工作线程
+    http_session.get_session()
+    mp = multiprocessing.get_context("fork")
+    q  = mp.Queue()
+
+    def child():                                         # 同 ProcessPoolExecutor 的 initializer
+        backtest_4h._init_worker(4)
+        fresh = http_session._session is None
+        q.put((fresh, len(okx_api.fetch_15m(SYM, end - 1999*M15, end - 1000*M15))))
+
+    p = mp.Process(target=child)
+    p.start(); p.join(30)
+    if p.is_alive():
+        p.kill()
+    assert p.exitcode == 0, "子进程翻页卡死（继承来的线程池没有工作线程）"
+    assert q.get(timeout=1) == (True, 1000)
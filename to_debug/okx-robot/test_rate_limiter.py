@@ -0,0 +1,43 @@
+# okx_quant_strategy/test_rate_limiter.py
+# ──────────────────────────────────────────
+"""rate_limiter：N 个进程各 set_share(1/N)，合计不超过接口预算（假时钟）"""
+# ──────────────────────────────────────────
+import pytest
+
+import rate_limiter
+from rate_limiter import RATE_LIMITS, SAFETY, TokenBucket
+
+
+class _Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def monotonic(self):
+        return self.t
+
+    def sleep(self, s):
+        self.t += max(s, 1e-6)           # 真 sleep 总会让时钟前进，浮点残差不至于原地打转
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(rate_limiter, "time", c)
+    monkeypatch.setattr(rate_limiter, "_buckets", {})        # set_share 改的是副本
+    monkeypatch.setattr(rate_limiter, "_share", 1.0)
+    return c
+
+
+@pytest.mark.parametrize("workers", [1, 3, 8, 32])
+@pytest.mark.parametrize("path", list(RATE_LIMITS))
+def test_shared_buckets_stay_within_limit(clock, path, workers):
+    limit, window = RATE_LIMITS[path]
+    rate_limiter.set_share(1/workers)
+    T, done = 60.0, 0
+    for _ in range(workers):             # 各进程一个桶、互不相干：逐个贪心拿满 T 秒
+        clock.t = 0.0
+        b = TokenBucket(limit, window)
+        while b.acquire() is not None and clock.t <= T:
+            done += 1
+    assert done <= limit * T / window
+    assert done >= limit * SAFETY * T / window * 0.95          # 预算也没被截断浪费
@@ -0,0 +1,139 @@
+# okx_quant_strategy/test_strategy_15m.py
+# ──────────────────────────────────────────
+"""strategy_15m：Trend15State 的环形缓冲（绝对序号、定长）；结构推进与原版列表实现逐根一致"""
+# ──────────────────────────────────────────
+import pytest
+
+import strategy_15m
+from risk_control import StrategyContext
+from strategy_15m import Trend15State
+from utils        import build_trend, find_highs_lows_15m
+
+SYM = "X-USDT-SWAP"
+
+
+def _ob(kl15, k, main_trend, half=0.3):
+    v = float(kl15.l[k] if main_trend == 'uptrend' else kl15.h[k])
+    return {"bottom": v - half, "top": v + half}
+
+
+def _points(st):
+    return [p for p in (st.hl, st.hh, st.ll, st.lh) if p]
+
+
+def _structure(st):
+    return (st.ob_touched, st.trend, st.exchange_trend, st.hl, st.hh, st.ll, st.lh)
+
+
+class _ListState:
+    """原版结构推进：整段列表缓冲，每次从头找触碰，HL / LH 候选存列表、翻转时取极值"""
+    def __init__(self, ob, main_trend, rows):
+        self.ob, self.main_trend, self.buf = ob, main_trend, list(rows)
+        self.trend = 'downtrend' if main_trend == 'uptrend' else 'uptrend'
+        self.ll = self.lh = self.hl = self.hh = None
+        self.ob_touched = self.exchange_trend = False
+        self.hl_candidates, self.lh_candidates = [], []
+        self._init_structure()
+
+    def _init_structure(self):
+        for start, (_, _, h, l, _) in enumerate(self.buf):
+            v = l if self.main_trend == 'uptrend' else h
+            if self.ob['bottom'] <= v <= self.ob['top']:
+                break
+        else:
+            return
+        self.ob_touched = True
+        _, info = build_trend(find_highs_lows_15m(self.buf[start:], self.main_trend, start))
+        if self.main_trend == 'uptrend':
+            self.lh, self.ll, self.trend = info.get('lh'), info.get('ll'), 'downtrend'
+        else:
+            self.hl, self.hh, self.trend = info.get('hl'), info.get('hh'), 'uptrend'
+
+    def update(self, k):
+        _, o, h, l, c = k
+        self.buf.append(k)
+        if not self.ob_touched:
+            return self._init_structure()
+        if (self.main_trend == 'uptrend' and l < self.ob['bottom']) or \
+           (self.main_trend == 'downtrend' and h > self.ob['top']):
+            self.ob_touched = False; return
+        n = len(self.buf) - 1
+        if self.trend == 'downtrend' and self.lh and c > self.lh[2]:
+            if self.exchange_trend:
+                self.ob_touched = False; return
+            self.trend, self.exchange_trend = 'uptrend', True
+            self.hl, self.hh = self.ll, (n, 'high', h)
+        elif self.trend == 'uptrend' and self.hl and c < self.hl[2]:
+            if self.exchange_trend:
+                self.ob_touched = False; return
+            self.trend, self.exchange_trend = 'downtrend', True
+            self.lh, self.ll = self.hh, (n, 'low', l)
+        elif len(self.buf) >= 3:
+            self._advance_high_low()
+
+    def _advance_high_low(self):
+        p3, prev, p1 = self.buf[-3:]
+        idx = len(self.buf) - 2
+        is_high = prev[2] > p3[2] and prev[2] > p1[2]
+        is_low  = prev[3] < p3[3] and prev[3] < p1[3]
+        if self.trend == 'uptrend':
+            if is_low:
+                self.hl_candidates.append((idx, 'low', prev[3]))
+            elif is_high:
+                if self.hl_candidates:
+                    cand = min(self.hl_candidates, key=lambda x: x[2])
+                    if prev[2] > (self.hh[2] if self.hh else -1e18):
+                        self.hl, self.hh = cand, (idx, 'high', prev[2])
+                    self.hl_candidates.clear()
+                elif self.hh is None or prev[2] > self.hh[2]:
+                    self.hh = (idx, 'high', prev[2])
+        else:
+            if is_high:
+                self.lh_candidates.append((idx, 'high', prev[2]))
+            elif is_low:
+                if self.lh_candidates:
+                    cand = max(self.lh_candidates, key=lambda x: x[2])
+                    if prev[3] < (self.ll[2] if self.ll else 1e18):
+                        self.lh, self.ll = cand, (idx, 'low', prev[3])
+                    self.lh_candidates.clear()
+                elif self.ll is None or prev[3] < self.ll[2]:
+                    self.ll = (idx, 'low', prev[3])
+
+
+@pytest.mark.parametrize("main_trend", ["uptrend", "downtrend"])
+def test_ring_keeps_absolute_seqs_and_bounded_size(synth, monkeypatch, main_trend):
+    monkeypatch.setattr(strategy_15m, "TREND15_BUFFER_SIZE", 64)
+    _, kl15 = synth(2, n4=40)
+    rows = kl15.rows()
+    st = Trend15State(SYM, _ob(kl15, 30, main_trend), main_trend, rows[0][0],
+                      rows[:20], ctx=StrategyContext())
+    seen = 0
+    for n, k in enumerate(rows[20:], 21):
+        st.update(k)
+        buf = st.kline_buffer
+        assert buf.end == n and len(buf) == min(n, 64)
+        assert buf[-1] == k and buf[buf.start] == rows[buf.start]
+        for seq, kind, v in _points(st):                    # 结构点下标 = 全序列里的位置
+            assert v == rows[seq][2 if kind == 'high' else 3]
+            seen += 1
+    assert seen
+    with pytest.raises(IndexError):
+        buf[buf.start - 1]
+
+
+@pytest.mark.parametrize("main_trend", ["uptrend", "downtrend"])
+@pytest.mark.parametrize("seed", range(6))
+def test_structure_matches_list_reference(synth, seed, main_trend):
+    """缓冲未淘汰时：滚动极值候选 + 增量找触碰 与 原版列表实现每根后结构相同"""
+    _, kl15 = synth(seed, n4=60)
+    rows = kl15.rows()
+    flips = 0
+    for touch in (80, 300, 600):                     # 几个 OB 位置，保证走到结构破坏分支
+        ob  = _ob(kl15, touch, main_trend, half=1.0)
+        st  = Trend15State(SYM, ob, main_trend, rows[0][0], rows[:60], ctx=StrategyContext())
+        ref = _ListState(ob, main_trend, rows[:60])
+        for k in rows[60:]:
+            st.update(k); ref.update(k)
+            assert _structure(st) == _structure(ref), (touch, k[0])
+            flips += st.exchange_trend
+    assert flips
@@ -0,0 +1,35 @@
+# okx_quant_strategy/test_strategy_4h.py
+# ──────────────────────────────────────────
+"""strategy_4h：Structure4H 与 analyze_4h 全量重算逐根一致；窗口滑动不重建"""
+# ──────────────────────────────────────────
+import pytest
+
+from strategy_4h import Structure4H, analyze_4h
+
+
+@pytest.mark.parametrize("window", [None, 30, 120])
+@pytest.mark.parametrize("seed", range(4))
+def test_structure_matches_full_recompute(synth, seed, window):
+    kl4, _ = synth(seed, n4=260)
+    rows = kl4.ohlc_rows()
+    s4 = Structure4H(window=window)
+    for k, row in enumerate(rows):
+        s4.push(row)
+        if window and k % 3:                         # 隔几根才查：滑动后的惰性重走也要对
+            continue
+        lo = 0 if window is None else max(0, k + 1 - window)
+        assert s4.analyze() == analyze_4h(rows[lo:k+1], "X"), k
+    assert len(s4) == min(len(rows), window or len(rows))
+
+
+def test_window_slide_without_query_does_no_walk(synth, monkeypatch):
+    """轮询路径只喂 K 线、由 analyze_4h_batch 统一分析：满窗后 push 不碰趋势状态"""
+    kl4, _ = synth(0, n4=200)
+    rows = kl4.ohlc_rows()
+    s4 = Structure4H(rows[:120], window=120)
+    walks = []
+    monkeypatch.setattr(Structure4H, "_point", lambda self, *f: walks.append(f))
+    for row in rows[120:]:
+        s4.push(row)
+    assert not walks and len(s4) == 120
+    assert list(s4.c) == [r[3] for r in rows[-120:]]
@@ -0,0 +1,61 @@
+# okx_quant_strategy/universe.py
+# ──────────────────────────────────────────
+"""
+交易币种池：一次批量拉全部 SWAP tickers，按 24h 成交额（USDT）排序，
+剔除低于 MIN_VOLUME_THRESHOLD 的合约，只对剩下的币种拉 K 线
+· select_universe()       一次性筛选
+· UniverseRefresher       定期刷新，返回新增 / 移除的币种
+"""
+# ──────────────────────────────────────────
+import time
+from okx_api import fetch_swap_tickers
+from config  import MIN_VOLUME_THRESHOLD, UNIVERSE_SIZE, UNIVERSE_REFRESH_HOURS
+from logger  import logger
+
+def turnover_usdt(t:dict):
+    """24h 成交额 ≈ volCcy24h(币数) × last；字段缺失视为 0"""
+    try:
+        return float(t["volCcy24h"]) * float(t["last"])
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+def select_universe(limit:int=UNIVERSE_SIZE,
+                    min_turnover:float=MIN_VOLUME_THRESHOLD):
+    """
+    USDT 本位永续按 24h 成交额降序，过滤后取前 limit 个 → [instId, ...]
+    """
+    ranked = sorted(((turnover_usdt(t), t["instId"])
+                     for t in fetch_swap_tickers()
+                     if t.get("instId", "").endswith("-USDT-SWAP")),
+                    reverse=True)
+    return [s for v, s in ranked if v >= min_turnover][:limit]
+
+
+class UniverseRefresher:
+    def __init__(self, limit:int=UNIVERSE_SIZE,
+                 every_hours:float=UNIVERSE_REFRESH_HOURS):
+        self.limit   = limit
+        self.every   = every_hours * 3600
+        self.symbols = []
+        self.stamp   = 0.0           # 上次刷新所属的计划边界（every 的整数倍）
+
+    def due(self):
+        return time.time() - self.stamp >= self.every
+
+    def refresh(self):
+        """
+        重新筛选；返回 (added, removed)。
+        拉取失败（空列表）时保留旧币种池，不做增删。
+        stamp 记拉取前所在的计划边界而非完成时间，拉取耗时不会让下次刷新往后漂
+        """
+        slot = time.time() // self.every * self.every
+        new = select_universe(self.limit)
+        if not new:
+            logger.warning("[币种池] tickers 为空，沿用旧币种池")
+            return [], []
+        old = set(self.symbols)
+        added   = [s for s in new if s not in old]
+        removed = [s for s in self.symbols if s not in set(new)]
+        self.symbols, self.stamp = new, slot
+        logger.info(f"[币种池] {len(new)} 个（+{len(added)} / -{len(removed)}）")
+        return added, removed
@@ -1,163 +1,210 @@
 # okx_quant_strategy/utils.py
+import numpy as np
+from candles import as_ohlc, SeqRing
+
+HIGH, LOW, BOTH = 1, -1, 0       # 分形类型编码
+_NAMES = np.array(['low', 'both', 'high'], dtype=object)   # 下标 kind+1
+
+def _fractals(highs, lows):
+    """
+    三根分形（向量化）：中间一根的高点严格高于左右 / 低点严格低于左右
+    → (idx, kind)；kind: HIGH / LOW / BOTH（同一根既是高点又是低点）
+    """
+    h, l    = highs[1:-1], lows[1:-1]
+    is_high = (h > highs[:-2]) & (h > highs[2:])
+    is_low  = (l < lows[:-2])  & (l < lows[2:])
+    pos     = np.flatnonzero(is_high | is_low)
+    kind    = is_high[pos].astype(np.int64) - is_low[pos]
+    return pos + 1, kind
+
+def _alternate_keep(kind, highs, lows, owner=None):
+    """
+    高低点交替合并（数组版，结果与逐点版一致）：
+    · BOTH 取与前一点相反的类型（第一个点视为高点），即前一确定点之后逐个翻转
+    · 连续同类点只留最极端的一个（并列取最早）
+    owner: 每个点所属序列（如币种行号，非降序）；给定时各序列分别合并
+    → (keep, typ, val)：保留点在输入中的位置、类型编码、价格
+    """
+    if not len(kind):                                 # 没有分形：reduceat 不接受空输入
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    pos   = np.arange(len(kind))
+    seg   = np.r_[True, owner[1:] != owner[:-1]] if owner is not None \
+            else (pos == 0)                           # 各序列首点
+    first = np.maximum.accumulate(np.where(seg, pos, 0))
+    last  = np.maximum.accumulate(np.where(kind != BOTH, pos, -1))   # 前一确定点
+    has   = last >= first
+    last  = np.where(has, last, first - 1)
+    base  = np.where(has, kind[np.maximum(last, 0)], LOW)
+    typ   = np.where((pos - last) % 2 == 1, -base, base)
+    val   = np.where(typ == HIGH, highs, lows)
+
+    start = seg | np.r_[True, typ[1:] != typ[:-1]]   # 同类连续段
+    grp   = np.cumsum(start) - 1
+    sval  = val * typ                            # 低点取负 → 统一取段内最大
+    best  = np.maximum.reduceat(sval, np.flatnonzero(start))
+    hit   = np.flatnonzero(sval == best[grp])
+    hgrp  = grp[hit]
+    keep  = hit[np.r_[True, hgrp[1:] != hgrp[:-1]]]   # 每段第一个最值
+    return keep, typ[keep], val[keep]
+
+def _alternate(idx, kind, highs, lows):
+    """单序列交替合并；highs / lows 为 idx 处的价格 → [(i, 'high'|'low', price), ...]"""
+    if not len(idx):
+        return []
+    keep, typ, val = _alternate_keep(kind, highs, lows)
+    return list(zip(idx[keep].tolist(), _NAMES[typ + 1].tolist(), val.tolist()))
 
 def find_highs_lows(candles):
-    temp = []
-    for i in range(1, len(candles) - 1):
-        o, h, l, c = candles[i]
-        prev_h, next_h = candles[i - 1][1], candles[i + 1][1]
-        prev_l, next_l = candles[i - 1][2], candles[i + 1][2]
-
-        is_high = h > prev_h and h > next_h
-        is_low = l < prev_l and l < next_l
-
-        if is_high and is_low:
-            temp.append((i, 'both', h, l))
-        elif is_high:
-            temp.append((i, 'high', h))
-        elif is_low:
-            temp.append((i, 'low', l))
-
-    filtered = []
-    for p in temp:
-        if not filtered:
-            if p[1] == 'both':
-                filtered.append((p[0], 'high', p[2]))
-            else:
-                filtered.append(p)
-        else:
-            last_type = filtered[-1][1]
-            if p[1] == 'both':
-                chosen = 'low' if last_type == 'high' else 'high'
-                value = p[3] if chosen == 'low' else p[2]
-                filtered.append((p[0], chosen, value))
-            elif p[1] != last_type:
-                filtered.append(p)
-            else:
-                if p[1] == 'high' and p[2] > filtered[-1][2]:
-                    filtered[-1] = p
-                elif p[1] == 'low' and p[2] < filtered[-1][2]:
-                    filtered[-1] = p
-    return filtered
-
-def build_trend(points):
-    trend = None
-    trend_info = {
-        'highs': [],
-        'lows': [],
-        'status': None,
-        'hl': None,
-        'hh': None,
-        'll': None,
-        'lh': None
-    }
-
-    i = 0
-    while i <= len(points) - 4:
-        p1, p2, p3, p4 = points[i:i+4]
-        if p1[1] == 'high' and p2[1] == 'low' and p3[1] == 'high' and p4[1] == 'low':
-            if p3[2] > p1[2] and p4[2] > p2[2]:
-                trend = 'uptrend'
-                trend_info['hh'] = p3
-                trend_info['hl'] = p4
-                trend_info['status'] = trend
-                i += 4
-                break
-        elif p1[1] == 'low' and p2[1] == 'high' and p3[1] == 'low' and p4[1] == 'high':
-            if p3[2] < p1[2] and p4[2] < p2[2]:
-                trend = 'downtrend'
-                trend_info['ll'] = p3
-                trend_info['lh'] = p4
-                trend_info['status'] = trend
-                i += 4
-                break
-        i += 1
-
-    if trend is None:
-        return None, trend_info
-
-    pending_low = None
-    pending_high = None
-
-    for j in range(i, len(points)):
-        p = points[j]
-
-        if trend == 'uptrend':
+    """candles: CandleSeries 或 [[o,h,l,c], ...]"""
+    _, highs, lows, _ = as_ohlc(candles)
+    idx, kind = _fractals(highs, lows)
+    return _alternate(idx, kind, highs[idx], lows[idx])
+
+def build_trend(points, compact=False):
+    """
+    高低点序列 → (trend, trend_info)
+    trend_info: status / hh / hl / ll / lh（关键点）+ highs / lows（全部高 / 低点）
+    compact=True: 只要关键点，不生成 highs / lows 列表
+    逐点推进由 TrendWalker 完成：上一个高 / 低点滚动记录，不再回扫 points[:j]
+    """
+    w = TrendWalker(keep_points=not compact)
+    for p in points:
+        w.push(p)
+    return w.result()
+
+class TrendWalker:
+    """
+    build_trend 的逐点状态机（build_trend 与 strategy_4h.Structure4H 共用）
+    · push(p)          : 按顺序喂入“已定型”的高低点，每点 O(1)
+    · result(last)     : 已定型点 + 暂定末点 last 上 build_trend 的结果，
+                         在副本上套用 last，不改动自身状态
+    趋势翻转时需要的“此前最后一个高 / 低点”由 last_high / last_low 滚动维护
+    keep_points=False  : 不累积 highs / lows（对应 build_trend 的 compact）
+    """
+    __slots__ = ("trend", "hh", "hl", "ll", "lh", "pending_low", "pending_high",
+                 "last_high", "last_low", "window", "highs", "lows")
+
+    def __init__(self, keep_points=True):
+        self.trend = self.hh = self.hl = self.ll = self.lh = None
+        self.pending_low = self.pending_high = None
+        self.last_high = self.last_low = None
+        self.window = ()                 # 趋势确立前最近 3 个点
+        self.highs, self.lows = ([], []) if keep_points else (None, None)
+
+    def _clone(self):
+        w = TrendWalker.__new__(TrendWalker)
+        for k in self.__slots__:
+            setattr(w, k, getattr(self, k))
+        return w
+
+    def _step(self, p):
+        if self.trend is None:                       # 寻找首个 高低高低 / 低高低高
+            w = self.window + (p,)
+            if len(w) == 4:
+                p1, p2, p3, p4 = w
+                if p1[1] == 'high' and p2[1] == 'low' and p3[1] == 'high' and p4[1] == 'low':
+                    if p3[2] > p1[2] and p4[2] > p2[2]:
+                        self.trend, self.hh, self.hl = 'uptrend', p3, p4
+                elif p1[1] == 'low' and p2[1] == 'high' and p3[1] == 'low' and p4[1] == 'high':
+                    if p3[2] < p1[2] and p4[2] < p2[2]:
+                        self.trend, self.ll, self.lh = 'downtrend', p3, p4
+            self.window = w[-3:]
+
+        elif self.trend == 'uptrend':
             if p[1] == 'low':
-                if p[2] < trend_info['hl'][2]:
-                    trend = 'downtrend'
-                    trend_info['ll'] = p
-                    prev_highs = [x for x in points[:j] if x[1] == 'high']
-                    trend_info['lh'] = prev_highs[-1] if prev_highs else trend_info['hh']
-                    pending_low = None
-                    pending_high = None
-                else:
-                    if pending_low is None or p[2] < pending_low[2]:
-                        pending_low = p
-            elif p[1] == 'high' and pending_low:
-                if p[2] > trend_info['hh'][2] and pending_low[2] > trend_info['hl'][2]:
-                    trend_info['hh'] = p
-                    trend_info['hl'] = pending_low
-                    pending_low = None
-
-        elif trend == 'downtrend':
+                if p[2] < self.hl[2]:
+                    self.trend, self.ll = 'downtrend', p
+                    self.lh = self.last_high or self.hh
+                    self.pending_low = self.pending_high = None
+                elif self.pending_low is None or p[2] < self.pending_low[2]:
+                    self.pending_low = p
+            elif p[1] == 'high' and self.pending_low:
+                if p[2] > self.hh[2] and self.pending_low[2] > self.hl[2]:
+                    self.hh, self.hl = p, self.pending_low
+                    self.pending_low = None
+
+        else:
             if p[1] == 'high':
-                if p[2] > trend_info['lh'][2]:
-                    trend = 'uptrend'
-                    trend_info['hh'] = p
-                    prev_lows = [x for x in points[:j] if x[1] == 'low']
-                    trend_info['hl'] = prev_lows[-1] if prev_lows else trend_info['ll']
-                    pending_low = None
-                    pending_high = None
-                else:
-                    if pending_high is None or p[2] > pending_high[2]:
-                        pending_high = p
-            elif p[1] == 'low' and pending_high:
-                if p[2] < trend_info['ll'][2] and pending_high[2] < trend_info['lh'][2]:
-                    trend_info['ll'] = p
-                    trend_info['lh'] = pending_high
-                    pending_high = None
-
-    trend_info['status'] = trend
-    trend_info['highs'] = [p for p in points if p[1] == 'high']
-    trend_info['lows'] = [p for p in points if p[1] == 'low']
-    return trend, trend_info
+                if p[2] > self.lh[2]:
+                    self.trend, self.hh = 'uptrend', p
+                    self.hl = self.last_low or self.ll
+                    self.pending_low = self.pending_high = None
+                elif self.pending_high is None or p[2] > self.pending_high[2]:
+                    self.pending_high = p
+            elif p[1] == 'low' and self.pending_high:
+                if p[2] < self.ll[2] and self.pending_high[2] < self.lh[2]:
+                    self.ll, self.lh = p, self.pending_high
+                    self.pending_high = None
+
+        if p[1] == 'high':
+            self.last_high = p
+        else:
+            self.last_low = p
+
+    def push(self, p):
+        self._step(p)
+        if self.highs is not None:
+            (self.highs if p[1] == 'high' else self.lows).append(p)
+
+    def result(self, last=None):
+        """→ (trend, trend_info)，与 build_trend(已定型点 + [last]) 相同"""
+        w = self
+        if last is not None:
+            w = self._clone()
+            w._step(last)
+        info = {'status': w.trend, 'hl': w.hl, 'hh': w.hh, 'll': w.ll, 'lh': w.lh}
+        if self.highs is None:                       # compact
+            return w.trend, info
+        if w.trend is None:
+            info['highs'], info['lows'] = [], []
+        else:
+            info['highs'] = self.highs + [last] if last and last[1] == 'high' else self.highs[:]
+            info['lows']  = self.lows + [last] if last and last[1] == 'low' else self.lows[:]
+        return w.trend, info
+
+def last_body_index(opens, closes):
+    """
+    → (last_bear, last_bull) 两个下标数组：
+      last_bear[i] = i 及之前最近一根下跌实体 (C<O) 的下标，没有为 -1；last_bull 同理
+    OB 起点为任意拐点 j 时，反向实体即 last_bear[j] / last_bull[j]，一次查表
+    二维输入（币种 × K 线）按行各自计算；NaN 填充位不算实体
+    """
+    o, c = np.asarray(opens, dtype=np.float64), np.asarray(closes, dtype=np.float64)
+    pos  = np.arange(c.shape[-1])
+    return (np.maximum.accumulate(np.where(c < o, pos, -1), axis=-1),
+            np.maximum.accumulate(np.where(c > o, pos, -1), axis=-1))
+
+class BodyIndex:
+    """
+    last_body_index 的增量版：K 线逐根到来时 push(o, c)，O(1)
+    capacity 给定时用 SeqRing 只保留最近 capacity 根（下标为绝对序号）
+    """
+    __slots__ = ("bear", "bull", "n")
+
+    def __init__(self, opens=(), closes=(), capacity:int=None):
+        bear, bull = last_body_index(opens, closes)
+        self.bear, self.bull = bear.tolist(), bull.tolist()
+        self.n = len(self.bear)                    # 已喂入根数 = 下一根的序号
+        if capacity:
+            self.bear = SeqRing(capacity, self.bear)
+            self.bull = SeqRing(capacity, self.bull)
+
+    def push(self, o, c):
+        n = self.n
+        self.bear.append(n if c < o else (self.bear[-1] if n else -1))
+        self.bull.append(n if c > o else (self.bull[-1] if n else -1))
+        self.n += 1
 
 def find_highs_lows_15m(retros, trend, ob_touch_index):
-    points = []
-    for i in range(1, len(retros) - 1):
-        prev, curr, next_ = retros[i - 1], retros[i], retros[i + 1]
-        h, l = curr[2], curr[3]
-        is_high = h > prev[2] and h > next_[2]
-        is_low = l < prev[3] and l < next_[3]
-        if is_high and is_low:
-            points.append((i, 'both', h, l))
-        elif is_high:
-            points.append((i, 'high', h))
-        elif is_low:
-            points.append((i, 'low', l))
-    ob_k = retros[0]
+    """
+    retros: CandleSeries 或 [[ts,o,h,l,c], ...]，首根为 OB 触碰处，按趋势补为起点
+    ob_touch_index: 触碰那根在调用方序列中的序号，返回的点下标以它为基准
+    """
+    _, highs, lows, _ = as_ohlc(retros)
+    idx, kind = _fractals(highs, lows)
     if trend == 'uptrend':
-        points = [(0, 'low', ob_k[3])] + points
+        idx, kind = np.r_[0, idx], np.r_[LOW, kind]
     elif trend == 'downtrend':
-        points = [(0, 'high', ob_k[2])] + points
-    filtered = []
-    for p in points:
-        if not filtered:
-            if p[1] == 'both':
-                filtered.append((p[0], 'high', p[2]))
-            else:
-                filtered.append(p)
-        else:
-            last_type = filtered[-1][1]
-            if p[1] == 'both':
-                chosen = 'low' if last_type == 'high' else 'high'
-                value = p[3] if chosen == 'low' else p[2]
-                filtered.append((p[0], chosen, value))
-            elif p[1] != last_type:
-                filtered.append(p)
-            else:
-                if p[1] == 'high' and p[2] > filtered[-1][2]:
-                    filtered[-1] = p
-                elif p[1] == 'low' and p[2] < filtered[-1][2]:
-                    filtered[-1] = p
-    return filtered
\ No newline at end of file
+        idx, kind = np.r_[0, idx], np.r_[HIGH, kind]
+    return [(i + ob_touch_index, t, v)
+            for i, t, v in _alternate(idx, kind, highs[idx], lows[idx])]